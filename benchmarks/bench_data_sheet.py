@@ -0,0 +1,61 @@
+'''
+Compares ways of filling the data.csv tab of a calculation template and saving the report:
+the previous per-row dataframe_to_rows + insert_rows fill, write_data_sheet and the write only (streamed) save_report.
+
+Run from the repository root:
+
+    python benchmarks/bench_data_sheet.py [REPEATS]
+
+A long run is simulated by repeating the scans of the tutorial raw file REPEATS times (default 20).
+'''
+import os
+import sys
+import tempfile
+import timeit
+
+import pandas as pd
+from openpyxl.utils.dataframe import dataframe_to_rows
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import pyce_tools.pyce_tools as pt
+
+TUTORIAL = os.path.join(os.path.dirname(__file__), '..', 'tutorial', 'data')
+RAW = os.path.join(TUTORIAL, 'raw', 'IN', 'aerosol', 'aerosol_bubbler_uf_sub_170320_1125.csv')
+TEMPLATE = os.path.join(TUTORIAL, '..', 'in_calculation_template_aerosols.xlsx')
+
+def previous_path(raw, outpath):
+    template, columns = pt.load_template(TEMPLATE)
+    template.remove(template["data.csv"])
+    sheet = template.create_sheet('data.csv')
+    for row in dataframe_to_rows(raw, index=False, header=True):
+        sheet.append(row)
+    sheet.insert_rows(idx=0)
+    template.save(outpath)
+
+def bulk(raw, outpath):
+    template, columns = pt.load_template(TEMPLATE)
+    pt.write_data_sheet(template, raw)
+    pt.save_report(template, outpath)
+
+def write_only(raw, outpath):
+    template, columns = pt.load_template(TEMPLATE)
+    pt.save_report(template, outpath, raw)
+
+def main(repeats):
+    times, values = pt.read_linda_raw(RAW, dtype=pt.numpy.float64)
+    template, columns = pt.load_template(TEMPLATE)
+    raw = pt.linda_raw_frame(times, values, columns)
+    raw = pd.concat([raw] * repeats, ignore_index=True)
+    outpath = os.path.join(tempfile.mkdtemp(), 'report.xlsx')
+    try:
+        print(f'{len(raw)} scans')
+        for name, func in [('dataframe_to_rows + insert_rows', previous_path),
+                           ('write_data_sheet', bulk),
+                           ('save_report (write only)', write_only)]:
+            best = min(timeit.repeat(lambda: func(raw, outpath), number=1, repeat=3))
+            print(f'{name:35s} {best*1000:8.1f} ms')
+    finally:
+        os.remove(outpath)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
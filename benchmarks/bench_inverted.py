@@ -0,0 +1,51 @@
+'''
+Compares the previous per-file reading in clean_inverted (two pd.read_csv calls per file, DataFrame.append and
+pd.to_datetime on six columns) with read_inverted.
+
+Run from the repository root:
+
+    python benchmarks/bench_inverted.py [FILES]
+
+A long campaign is simulated by copying the tutorial inverted Scanotron file FILES times (default 300).
+'''
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import pyce_tools.pyce_tools as pt
+
+INVERTED = os.path.join(os.path.dirname(__file__), '..', 'tutorial', 'data', 'interim', 'scanotron', 'inverted', 'pro', '20200317-dmps_cpc.csv')
+
+def previous_path(paths):
+    frames = []
+    for path in paths:
+        frames.append(pd.read_csv(path, skiprows=5, header=None, sep='\t'))
+        columns = pd.read_csv(path, skiprows=3, nrows=0, sep='\t').columns.tolist()
+    df = pd.concat(frames)
+    df.columns = [name.strip().replace('#', '').lower() for name in columns if 'conc...' not in name] + list(range(df.shape[1] - len(columns) + 1))
+    df = df.rename(columns={'yr':'year','mo':'month','dy':'day','hr':'hour','mn':'minute','sc':'second'})
+    df['time'] = pd.to_datetime(df[['year', 'month', 'day', 'hour', 'minute', 'second']])
+    return df
+
+def main(files):
+    folder = tempfile.mkdtemp()
+    try:
+        paths = []
+        for i in range(files):
+            paths.append(os.path.join(folder, f'{i:05d}.csv'))
+            shutil.copy(INVERTED, paths[-1])
+        print(f'{files} files')
+        for name, func in [('read_csv x2 + append + to_datetime', previous_path),
+                           ('read_inverted', pt.read_inverted)]:
+            best = min(timeit.repeat(lambda: func(paths), number=1, repeat=3))
+            print(f'{name:35s} {best*1000:8.1f} ms')
+    finally:
+        shutil.rmtree(folder)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
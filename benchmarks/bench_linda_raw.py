@@ -0,0 +1,51 @@
+'''
+Compares the previous raw LINDA ingest in calculate_raw (pd.read_csv plus str.split) with read_linda_raw.
+
+Run from the repository root:
+
+    python benchmarks/bench_linda_raw.py [REPEATS]
+
+A long run is simulated by repeating the scans of the tutorial raw file REPEATS times (default 200).
+'''
+import os
+import sys
+import tempfile
+import timeit
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import pyce_tools.pyce_tools as pt
+
+RAW = os.path.join(os.path.dirname(__file__), '..', 'tutorial', 'data', 'raw', 'IN', 'aerosol', 'aerosol_bubbler_uf_sub_170320_1125.csv')
+
+def previous_path(inpath):
+    raw = pd.read_csv(inpath, sep = ' ', header = None, parse_dates=False)
+    datetime_col = raw[0].str.split(' ', expand=True)
+    raw.insert(0, 'day',datetime_col[0])
+    raw[0]=datetime_col[1]
+    raw=raw.drop(columns=61)
+    return raw
+
+def streamed(inpath):
+    for times, values in pt.read_linda_raw(inpath, chunksize=10000):
+        pass
+
+def main(repeats):
+    with open(RAW) as f:
+        lines = f.read().splitlines()
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+        f.write('\n'.join(lines * repeats) + '\n')
+        path = f.name
+    try:
+        print(f'{len(lines) * repeats} scans')
+        for name, func in [('pd.read_csv + str.split', previous_path),
+                           ('read_linda_raw', pt.read_linda_raw),
+                           ('read_linda_raw (chunks of 10000)', streamed)]:
+            best = min(timeit.repeat(lambda: func(path), number=1, repeat=5))
+            print(f'{name:35s} {best*1000:8.1f} ms')
+    finally:
+        os.remove(path)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -6,8 +6,19 @@ from plotly.subplots import make_subplots
 import os
 import numpy
 from openpyxl import load_workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
+from openpyxl.utils import get_column_letter
 import datetime
+import concurrent.futures
+import contextlib
+import glob
+import pickle
+import hashlib
+import json
+import io
+import re
+import warnings
+import zipfile
+from xml.sax.saxutils import escape as xml_escape
 import scipy.stats as stats
 
 class inp(object):
@@ -58,37 +69,87 @@ class inp(object):
         self.cyto_bio = cyto_data[cyto_data['location']==cyto_location]
         self.inp = inp_data[(inp_data['location']==inp_location)&(inp_data['type']==inp_type)]
         self.results = {}
+        # (dataframe, dataframe sorted by time) of every bio, cyto or extra dataframe aligned so far, see align
+        self._sources = []
+
+    def _source(self, df):
+        # sort each dataframe only once per object; dataframes are told apart by identity, so do not change them in place
+        for source, sorted_source in self._sources:
+            if source is df:
+                return sorted_source
+        sorted_source = df if df.index.is_monotonic_increasing else df.sort_index()
+        self._sources.append((df, sorted_source))
+        return sorted_source
+
+    def align(self, rows, df, tolerance=None, match='nearest'):
+        '''
+        Matches a bio, cyto or other time series to INP samples. The time series is sorted once per INP object and reused by later calls.
+
+        Parameters
+        ------------
+        rows : df
+            INP samples with a datetime index (and start_date and stop_date columns for match='window').
+        df : df
+            Time series to match, with a datetime index.
+        tolerance : str or timedelta
+            Largest time between a sample and its nearest observation, e.g. '2h'. Samples without an observation that close get
+            missing values. [DEFAULT = None, any distance]
+        match : str
+            nearest: the observation nearest in time to the sample (ties go to the earlier one, as merge_asof).
+            window: the mean of the numeric columns over the sample's collection period (start_date to stop_date, see
+            :py:func:`aggregate_windows`). [DEFAULT = nearest]
+
+        Returns
+        ------------
+        aligned : df
+            The matched observations, one row per sample with the same index as rows.
+        '''
+        source = self._source(df)
+        if match == 'window':
+            windows = pd.DataFrame({'start': _parse_collection_dates(rows['start_date']), 'end': _parse_collection_dates(rows['stop_date'])})
+            aligned = aggregate_windows(source, windows)[0]
+        elif match == 'nearest':
+            times = source.index
+            sample_times = pd.DatetimeIndex(rows.index)
+            position = numpy.full(len(rows), -1)
+            if len(times) > 0:
+                # last observation at or before and first at or after each sample
+                before = times.searchsorted(sample_times, side='right') - 1
+                after = times.searchsorted(sample_times, side='left')
+                has_before = before >= 0
+                has_after = after < len(times)
+                before = numpy.clip(before, 0, len(times) - 1)
+                after = numpy.clip(after, 0, len(times) - 1)
+                to_before = (sample_times - times[before]).to_numpy()
+                to_after = (times[after] - sample_times).to_numpy()
+                use_after = has_after & (~has_before | (to_after < to_before))
+                found = has_before | has_after
+                if tolerance is not None:
+                    found &= numpy.where(use_after, to_after, to_before) <= pd.Timedelta(tolerance).to_timedelta64()
+                position = numpy.where(found, numpy.where(use_after, after, before), -1)
+            aligned = source.reset_index(drop=True).reindex(position)
+        else:
+            raise ValueError(f'Unknown match {match}. Choose from nearest or window.')
+        aligned.index = rows.index
+        return aligned
     
-    def corr(self, data, regime, temp):
-        stat = pd.DataFrame()
-        n = pd.DataFrame()
-        pInput = pd.DataFrame()
-        statCombined = pd.DataFrame()
-        nCombined = pd.DataFrame()
+    def corr(self, data, regime, temp, method='pearson', n_resamples=None, seed=None):
         regime = str(regime)
         df=data
         df = df.select_dtypes(exclude=['object'])
-        for column in df:
-            if column == regime:
-                continue
-            try:
-                stat = pd.DataFrame()
-                pInput = df.loc[:,[regime,column]].dropna()
-                ptest = stats.pearsonr(pInput[regime],pInput[column])
-                stat[column]=ptest
-                n = pInput.shape[0]
-                stat=stat.append({column:n}, ignore_index=True)
-                statT = stat.T
-                statCombined = statCombined.append(statT)
-            except ValueError:
-                continue
+        # correlate the regime column with every other column at once, see correlate
+        if n_resamples:
+            if method != 'pearson':
+                raise ValueError('Bootstrap and permutation significance is only available for pearson correlations.')
+            statCombined = correlation_resampling(df, regime, n_resamples=n_resamples, seed=seed)
+        else:
+            statCombined = correlate(df, regime, method=method)
                 
         statCombined['variable'] = statCombined.index
         # Remove self-correlations
         statCombined['variable']=statCombined['variable'].astype(str)
         statCombined =statCombined[~statCombined['variable'].str.startswith('-')]
-        # Calculate R^2 and name columns
-        statCombined = statCombined.rename(columns={0:'R',1:'p', 2:'n'})
+        # Calculate R^2
         statCombined['R^2'] = statCombined['R']**2
         
         # Add information
@@ -127,44 +188,116 @@ class inp(object):
 
         return print('done')
         
-    def correlations(self, temps, process, inp_units, dfs=None, size=None):
-        
+    def correlations(self, temps, process, inp_units, dfs=None, size=None, method='pearson', batch=False, n_resamples=None, seed=None,
+                     tolerance=None, match='nearest'):
+        '''
+        Correlates INP of a process with the uway bio, cyto bio and any extra dataframes (matched to the INP sample times by nearest time)
+        at each temperature. Results are saved in self.results[process][temp] as corrs (see corr) and the merged data.
+
+        Parameters
+        ------------
+        temps : list
+            Temperatures to correlate.
+        process : str
+            INP process. [UH, H]
+        inp_units : str
+            Column of INP concentrations.
+        dfs : list
+            Extra dataframes with a datetime index to correlate with. [DEFAULT = None]
+        size : str
+            Size of aerosol INP samples. [DEFAULT = None]
+        method : str
+            Correlation coefficient. [pearson, spearman, kendall] [DEFAULT = pearson]
+        batch : bool
+            Match the other dataframes to the sample times once and correlate all temperatures in one pass, instead of merging again
+            for every temperature. The results are the same. [DEFAULT = False]
+        n_resamples : int
+            Also calculate permutation p-values (p_permutation) and bootstrap 95% confidence intervals of R (R_lower, R_upper) with
+            this many resamples, see :py:func:`correlation_resampling`. Pearson only. [DEFAULT = None]
+        seed : int
+            Seed of the resampling, for reproducible results. [DEFAULT = None]
+        tolerance : str or timedelta
+            Largest time between an INP sample and the bio data matched to it, e.g. '2h'. [DEFAULT = None, any distance]
+        match : str
+            Match each sample with the nearest bio data (nearest) or with the mean over its collection period (window). See align.
+            [DEFAULT = nearest]
+        '''
         self.results.update({process:{}})
 
+        if batch:
+            return self._correlations_batch(temps, process, inp_units, dfs, size, method, n_resamples, seed, tolerance, match)
+
         for temp in temps:
             self.results[process].update({temp:{}})
             
                 
             # sort index
             self.inp = self.inp.sort_index()
-            self.uway_bio = self.uway_bio.sort_index()
-            self.cyto_bio = self.cyto_bio.sort_index()
 
-             # merge INP and uway bio dataframes on date. This process is slightly different if the INP type is aerosol
+            # select INP of this temperature and process. This is slightly different if the INP type is aerosol
             if self.inp_type =='aerosol':
-                inp_uway_bio = pd.merge_asof(self.inp[(self.inp['temp']==temp)&(self.inp['process']==process)&(self.inp['size']==size)][inp_units], self.uway_bio, left_index=True, right_index=True, direction='nearest')
+                rows = self.inp[(self.inp['temp']==temp)&(self.inp['process']==process)&(self.inp['size']==size)]
             
             else:
-                inp_uway_bio = pd.merge_asof(self.inp[(self.inp['temp']==temp)&(self.inp['process']==process)][inp_units], self.uway_bio, left_index=True, right_index=True, direction='nearest')
-
-            # merge INP with cyto dataframes on date
-            inp_uway_bio_cyto_bio = pd.merge_asof(inp_uway_bio, self.cyto_bio, left_index=True, right_index=True, direction='nearest')
-            
-            df_corr = inp_uway_bio_cyto_bio
+                rows = self.inp[(self.inp['temp']==temp)&(self.inp['process']==process)]
 
-            # if any dfs were given, merge them here
-            if dfs:
-                for df in dfs:
-                    df = df.sort_index()
-                    df_corr = pd.merge_asof(df_corr, df, left_index=True, right_index=True, direction='nearest')
+            # match the uway bio, cyto and any extra dataframes to the INP samples
+            df_corr = rows[[inp_units]]
+            for df in [self.uway_bio, self.cyto_bio] + list(dfs or []):
+                df_corr = _join_aligned(df_corr, self.align(rows, df, tolerance=tolerance, match=match))
             
-            [corrs, data_combined] = self.corr(df_corr, inp_units, temp)
+            [corrs, data_combined] = self.corr(df_corr, inp_units, temp, method=method, n_resamples=n_resamples, seed=seed)
             self.results[process][temp].update({'corrs':corrs})
             self.results[process][temp].update({'data':data_combined})
 
             
             print(f'Calculating correlations {process} INP samples of type={self.inp_type} at {temp}...Done!')
     
+    def _correlations_batch(self, temps, process, inp_units, dfs, size, method, n_resamples=None, seed=None, tolerance=None, match='nearest'):
+        if n_resamples and method != 'pearson':
+            raise ValueError('Bootstrap and permutation significance is only available for pearson correlations.')
+        # INP of the process at all requested temperatures
+        selection = (self.inp['temp'].isin(temps))&(self.inp['process']==process)
+        if self.inp_type =='aerosol':
+            selection = selection&(self.inp['size']==size)
+        inp_selected = self.inp[selection].sort_index()
+
+        # match the uway bio, cyto and extra dataframes to the sample times once
+        samples = inp_selected[~inp_selected.index.duplicated()]
+        aligned = pd.DataFrame({inp_units: numpy.nan}, index=samples.index)
+        for df in [self.uway_bio, self.cyto_bio] + list(dfs or []):
+            aligned = _join_aligned(aligned, self.align(samples, df, tolerance=tolerance, match=match))
+
+        # one row per sample and one column of INP per temperature; samples sharing a time are kept apart by their order
+        inp_selected = inp_selected.assign(_sample=inp_selected.groupby([inp_selected.index, 'temp']).cumcount())
+        wide = inp_selected.set_index([inp_selected.index, '_sample', 'temp'])[inp_units].unstack('temp')
+        # temperatures without samples get empty results, as in the loop
+        wide = wide.reindex(columns=list(dict.fromkeys(temps)))
+        bio = aligned.drop(columns=inp_units).reindex(wide.index.get_level_values(0)).select_dtypes(include=['number', 'bool'])
+
+        # all temperatures in one pass
+        r, p, n = _correlation_arrays(wide.to_numpy(dtype=float), bio.to_numpy(dtype=float), method)
+        if n_resamples:
+            p_perm, lower, upper = _resampled_correlation_arrays(wide.to_numpy(dtype=float), bio.to_numpy(dtype=float), n_resamples, seed=seed)
+
+        # Remove self-correlations
+        variables = pd.Index(bio.columns, dtype=object)
+        names = variables.astype(str)
+        usable = ~names.str.startswith('-')
+        temp_of_row = inp_selected['temp'].to_numpy()
+        for i, temp in enumerate(wide.columns):
+            self.results[process].update({temp:{}})
+            keep = (n[i] >= 2) & usable
+            columns = {'R': r[i][keep], 'p': p[i][keep], 'n': n[i][keep].astype(float)}
+            if n_resamples:
+                columns.update({'p_permutation': p_perm[i][keep], 'R_lower': lower[i][keep], 'R_upper': upper[i][keep]})
+            corrs = pd.DataFrame({**columns, 'variable': names[keep], 'R^2': r[i][keep]**2, 'inp_temp': temp}, index=variables[keep])
+            rows = inp_selected[temp_of_row==temp]
+            data_combined = aligned.reindex(rows.index).assign(**{inp_units: rows[inp_units].to_numpy()}).select_dtypes(exclude=['object'])
+            self.results[process][temp].update({'corrs':corrs})
+            self.results[process][temp].update({'data':data_combined})
+        print(f'Calculating correlations {process} INP samples of type={self.inp_type} at {len(wide.columns)} temperatures...Done!')
+
     def plot_corr_scatter(self, temp, units, processes, row_num):
         colors = ['steelblue','firebrick']
         tick_loc='inside'
@@ -255,10 +388,12 @@ class inp(object):
 
 
                 # make for all situations. only bold if significant.
-                    if self.results[process][temperature]['corrs'].loc[variable,'p'] < .05:
+                    # use the permutation p-value when the correlations were resampled
+                    p_column = 'p_permutation' if 'p_permutation' in self.results[process][temperature]['corrs'] else 'p'
+                    if self.results[process][temperature]['corrs'].loc[variable,p_column] < .05:
                         anno_text = '<b>R<sup>2</sup>=' + str(round(self.results[process][temperature]['corrs'].loc[variable,'R^2'],2))
 
-                    elif self.results[process][temperature]['corrs'].loc[variable,'p'] > .05:
+                    elif self.results[process][temperature]['corrs'].loc[variable,p_column] > .05:
                         anno_text = 'R<sup>2</sup>=' + str(round(self.results[process][temperature]['corrs'].loc[variable,'R^2'],2))
                     
                     x_val = [0.01, 0.41, 0.80]
@@ -356,7 +491,867 @@ class inp(object):
 
         return fig
 
-def calculate_raw_blank(type_, process, location, sample_name, collection_date, analysis_date, issues, num_tubes, vol_tube = 0.2, rinse_vol = 20, size = None):
+def _join_aligned(left, right):
+    '''
+    Joins dataframes with the same rows side by side, adding the suffixes _x and _y to columns in both as merge_asof does.
+    '''
+    overlap = left.columns.intersection(right.columns)
+    if len(overlap) > 0:
+        left = left.rename(columns={column: f'{column}_x' for column in overlap})
+        right = right.rename(columns={column: f'{column}_y' for column in overlap})
+    return pd.concat([left, right], axis=1)
+
+def _correlation_arrays(y, x, method = 'pearson'):
+    '''
+    Correlates every column of y (observations x targets) with every column of x (observations x variables) over their complete
+    pairs. Returns R, p and n as arrays of targets x variables. See :py:func:`correlate`.
+    '''
+    if method not in ('pearson', 'spearman', 'kendall'):
+        raise ValueError(f'Unknown method {method}. Choose from pearson, spearman or kendall.')
+    # observations x targets x variables
+    mask = ~numpy.isnan(y)[:, :, None] & ~numpy.isnan(x)[:, None, :]
+    n = mask.sum(axis=0)
+
+    if method == 'kendall':
+        r = numpy.full(n.shape, numpy.nan)
+        p = numpy.full(n.shape, numpy.nan)
+        for i, j in zip(*numpy.nonzero(n >= 2)):
+            r[i, j], p[i, j] = stats.kendalltau(y[mask[:, i, j], i], x[mask[:, i, j], j])
+        return r, p, n
+
+    shape = mask.shape
+    xs = numpy.where(mask, x[:, None, :], numpy.nan)
+    ys = numpy.where(mask, y[:, :, None], numpy.nan)
+    if method == 'spearman':
+        # rank each pair of columns over its complete pairs only
+        xs = pd.DataFrame(xs.reshape(shape[0], -1)).rank().to_numpy().reshape(shape)
+        ys = pd.DataFrame(ys.reshape(shape[0], -1)).rank().to_numpy().reshape(shape)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        dx = numpy.where(mask, xs - numpy.nansum(xs, axis=0)/n, 0)
+        dy = numpy.where(mask, ys - numpy.nansum(ys, axis=0)/n, 0)
+        r = (dx*dy).sum(axis=0)/numpy.sqrt((dx**2).sum(axis=0)*(dy**2).sum(axis=0))
+        r = numpy.clip(r, -1, 1)
+        # two-sided p-value from the t distribution with n-2 degrees of freedom, as scipy.stats.pearsonr
+        t = r*numpy.sqrt((n - 2)/((1 - r)*(1 + r)))
+        p = 2*stats.t.sf(numpy.abs(t), n - 2)
+    p = numpy.where(n == 2, 1.0, p)
+    return r, p, n
+
+def correlate(data, target, method = 'pearson'):
+    '''
+    Correlates one column of a dataframe with every other numeric column, using the rows where both are present (pairwise complete).
+
+    Pearson and Spearman coefficients and their p-values (two-sided, as scipy.stats.pearsonr) are calculated for all columns at once
+    with masked array algebra. Kendall's tau is calculated column by column with scipy.stats.kendalltau.
+
+    Parameters
+    ------------
+    data : df
+        Observations, one per row. Non-numeric columns are ignored.
+    target : str
+        Column to correlate with the others.
+    method : str
+        Correlation coefficient. [pearson, spearman, kendall] [DEFAULT = pearson]
+
+    Returns
+    ------------
+    stats : df
+        One row per column with at least two complete pairs, in the order of data, with columns R, p and n.
+    '''
+    data = data.select_dtypes(include=['number', 'bool'])
+    columns = [column for column in data.columns if column != target]
+    r, p, n = _correlation_arrays(data[[target]].to_numpy(dtype=float), data[columns].to_numpy(dtype=float), method)
+    r, p, n = r[0], p[0], n[0]
+    keep = n >= 2
+    return pd.DataFrame({'R': r[keep], 'p': p[keep], 'n': n[keep].astype(float)}, index=pd.Index(columns, dtype=object)[keep])
+
+def _resampled_correlation_arrays(y, x, n_resamples = 10000, confidence = 0.95, seed = None, chunksize = 1000, max_workers = None):
+    '''
+    Bootstrap confidence intervals and permutation p-values of the Pearson correlations of every column of y (observations x targets)
+    with every column of x (observations x variables), over their complete pairs. Returns the permutation p-values and the lower and
+    upper confidence limits of R as arrays of targets x variables. See :py:func:`correlation_resampling`.
+    '''
+    rng = numpy.random.default_rng(seed)
+    N, T = y.shape
+    V = x.shape[1]
+    # all random numbers at once; for a target with m samples, the first m columns give its resampled rows and its permutations
+    boot_keys = rng.random((n_resamples, N))
+    perm_keys = rng.random((n_resamples, N))
+
+    r_obs = _correlation_arrays(y, x)[0]
+    valid_x = ~numpy.isnan(x)
+    # correlations do not change with a shift, so center for accuracy and then zero the missing values
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        x0 = numpy.where(valid_x, x - numpy.nan_to_num(numpy.nanmean(x, axis=0)), 0)
+    vx = valid_x.astype(float)
+
+    def r_from_sums(n, sx, sy, sxx, syy, sxy):
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            r = (sxy - sx*sy/n)/numpy.sqrt((sxx - sx**2/n)*(syy - sy**2/n))
+        r[n < 2] = numpy.nan
+        return numpy.clip(r, -1, 1)
+
+    def chunk(t, y0, vx, x0, boot, perm):
+        m = len(y0)
+        # bootstrap: each resample is a vector of row counts, so all the sums are one matrix product
+        counts = numpy.bincount((boot + numpy.arange(len(boot))[:, None]*m).ravel(), minlength=len(boot)*m).reshape(len(boot), m).astype(float)
+        sums = counts @ numpy.hstack([vx, x0, vx*y0[:, None], x0**2, vx*(y0**2)[:, None], x0*y0[:, None]])
+        r_boot = r_from_sums(*numpy.split(sums, 6, axis=1))
+        # permutation: shuffle the target against the variables
+        yp = y0[perm]
+        n, sx, sxx = numpy.split(numpy.ones_like(yp) @ numpy.hstack([vx, x0, x0**2]), 3, axis=1)
+        sy, sxy = numpy.split(yp @ numpy.hstack([vx, x0]), 2, axis=1)
+        syy = (yp**2) @ vx
+        r_perm = r_from_sums(n, sx, sy, sxx, syy, sxy)
+        with numpy.errstate(invalid='ignore'):
+            exceed = (numpy.abs(r_perm) >= numpy.abs(r_obs[t]) - 1e-12).sum(axis=0)
+        return r_boot, exceed, (~numpy.isnan(r_perm)).sum(axis=0)
+
+    p_perm = numpy.full((T, V), numpy.nan)
+    lower = numpy.full((T, V), numpy.nan)
+    upper = numpy.full((T, V), numpy.nan)
+    alpha = (1 - confidence)/2
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for t in range(T):
+            # resample the samples of this target only
+            rows = numpy.flatnonzero(~numpy.isnan(y[:, t]))
+            m = len(rows)
+            if m < 2:
+                continue
+            y0 = y[rows, t] - y[rows, t].mean()
+            boot = numpy.minimum((boot_keys[:, :m]*m).astype(int), m - 1)
+            perm = numpy.argsort(perm_keys[:, :m], axis=1)
+            jobs = [executor.submit(chunk, t, y0, vx[rows], x0[rows], boot[lo:lo + chunksize], perm[lo:lo + chunksize])
+                    for lo in range(0, n_resamples, chunksize)]
+            parts = [job.result() for job in jobs]
+            r_boot = numpy.concatenate([part[0] for part in parts])
+            exceed = sum(part[1] for part in parts)
+            valid = sum(part[2] for part in parts)
+            p_perm[t] = numpy.where(numpy.isnan(r_obs[t]), numpy.nan, (exceed + 1)/(valid + 1))
+            with warnings.catch_warnings():
+                # variables with too few pairs have no bootstrap correlations
+                warnings.simplefilter('ignore', RuntimeWarning)
+                lower[t], upper[t] = numpy.nanquantile(r_boot, [alpha, 1 - alpha], axis=0)
+    return p_perm, lower, upper
+
+def correlation_resampling(data, target, n_resamples = 10000, confidence = 0.95, seed = None, chunksize = 1000, max_workers = None):
+    '''
+    Pearson correlations of one column of a dataframe with every other numeric column (see :py:func:`correlate`), with bootstrap
+    confidence intervals and permutation p-values for small datasets.
+
+    All bootstrap and permutation index sets are drawn up front as integer matrices. Each resample then only adds a row to a matrix
+    product, so the correlations of all variables are evaluated together, in chunks of resamples on a thread pool.
+
+    Parameters
+    ------------
+    data : df
+        Observations, one per row. Non-numeric columns are ignored.
+    target : str
+        Column to correlate with the others.
+    n_resamples : int
+        Number of bootstrap resamples and of permutations. [DEFAULT = 10000]
+    confidence : float
+        Confidence level of the bootstrap (percentile) intervals. [DEFAULT = 0.95]
+    seed : int
+        Seed of the random number generator, for reproducible results. [DEFAULT = None]
+    chunksize : int
+        Number of resamples evaluated at once by a thread. [DEFAULT = 1000]
+    max_workers : int
+        Number of threads. [DEFAULT = None, chosen by concurrent.futures]
+
+    Returns
+    ------------
+    stats : df
+        The columns of :py:func:`correlate` (R, p and n) and p_permutation (two-sided), R_lower and R_upper.
+
+    Notes
+    ------------
+    Only the samples of the target are resampled and permuted. For a variable with missing values the number of complete pairs
+    therefore varies between resamples.
+    '''
+    data = data.select_dtypes(include=['number', 'bool'])
+    columns = [column for column in data.columns if column != target]
+    y = data[[target]].to_numpy(dtype=float)
+    x = data[columns].to_numpy(dtype=float)
+    result = correlate(data, target)
+    p_perm, lower, upper = _resampled_correlation_arrays(y, x, n_resamples, confidence, seed, chunksize, max_workers)
+    keep = pd.Index(columns, dtype=object).isin(result.index)
+    result['p_permutation'] = p_perm[0][keep]
+    result['R_lower'] = lower[0][keep]
+    result['R_upper'] = upper[0][keep]
+    return result
+
+# Read-only data shared by the workers of a correlation sweep, set once per worker by _init_sweep
+_SWEEP_DATA = {}
+
+def _init_sweep(cyto_data, uway_bio_data, inp_data, dfs):
+    '''
+    Keeps the dataframes of a correlation sweep in the worker. With the fork start method they are inherited (copy on write);
+    with spawn, each worker receives a pickled copy.
+    '''
+    _SWEEP_DATA.update(cyto_data=cyto_data, uway_bio_data=uway_bio_data, inp_data=inp_data, dfs=dfs)
+
+def _correlation_sweep_job(cell, inp_units, method, n_resamples = None, seed = None, tolerance = None, match = 'nearest'):
+    '''
+    Runs the correlations of one cell of a correlation sweep and returns them as a long table, or the error message instead of raising.
+    '''
+    try:
+        obj = inp(cell['inp_type'], cell['inp_location'], cell['cyto_location'], _SWEEP_DATA['cyto_data'], _SWEEP_DATA['uway_bio_data'], _SWEEP_DATA['inp_data'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            obj.correlations(cell['temps'], cell['process'], inp_units, dfs=_SWEEP_DATA['dfs'], size=cell.get('size'), method=method, batch=True, n_resamples=n_resamples, seed=seed,
+                             tolerance=tolerance, match=match)
+        frames = [result['corrs'] for result in obj.results[cell['process']].values()]
+        return combine_frames(frames, ignore_index=True) if frames else None, None
+    except Exception as e:
+        return None, f'{type(e).__name__}: {e}'
+
+def correlation_sweep(grid, cyto_data, uway_bio_data, inp_data, inp_units, dfs = None, method = 'pearson', max_workers = None, n_resamples = None, seed = None,
+                      tolerance = None, match = 'nearest'):
+    '''
+    Runs :py:func:`inp.correlations` for every cell of a grid of INP types, locations, processes and sizes on a process pool, and
+    collects the results in one table.
+
+    The dataframes are handed to each worker process once, when it starts, rather than with every cell. They are not shared
+    between workers: with the spawn start method (the default on Windows and macOS) every worker receives and holds its own copy,
+    and only with fork (the default on Linux) are they inherited copy on write. Lower max_workers if the data are too large to
+    copy to every worker. Each cell builds its inp object and correlates all of its temperatures in one pass (batch=True).
+    A cell that fails is reported and skipped.
+
+    Parameters
+    ------------
+    grid : df or list
+        One row (or dict) per cell with inp_type, inp_location, cyto_location, process, size (aerosol only) and temps (list of
+        temperatures). [example: build a list of dicts with itertools.product]
+    cyto_data : df
+        A dataframe of cyto data, see :py:class:`inp`.
+    uway_bio_data : df
+        A dataframe of bio data, see :py:class:`inp`.
+    inp_data : df
+        A dataframe of INP data, see :py:class:`inp`.
+    inp_units : str
+        Column of INP concentrations.
+    dfs : list
+        Extra dataframes with a datetime index to correlate with. [DEFAULT = None]
+    method : str
+        Correlation coefficient. [pearson, spearman, kendall] [DEFAULT = pearson]
+    max_workers : int
+        Number of worker processes. Defaults to the number of processors on the machine.
+    n_resamples : int
+        Also calculate permutation p-values and bootstrap confidence intervals, see :py:func:`inp.correlations`. [DEFAULT = None]
+    seed : int
+        Seed of the resampling, for reproducible results. [DEFAULT = None]
+    tolerance : str or timedelta
+        Largest time between an INP sample and the bio data matched to it, see :py:func:`inp.correlations`. [DEFAULT = None]
+    match : str
+        Match bio data by nearest time or as the mean over each collection period. [nearest, window] [DEFAULT = nearest]
+
+    Returns
+    ------------
+    results : df
+        One row per cell, temperature and variable with inp_type, inp_location, cyto_location, process, size, inp_temp, variable,
+        R, p, n and R^2 (and p_permutation, R_lower and R_upper when resampled).
+
+    Examples
+    ---------
+    >>> grid = [dict(inp_type='seawater', inp_location=loc, cyto_location='uway', process=proc, temps=['-20.0', '-22.0'])
+    ...         for loc, proc in itertools.product(['uway', 'wkbtsml'], ['UH', 'H'])]
+    >>> results = pt.correlation_sweep(grid, cyto, uway_bio, inp_data, 'inp/ml')
+    '''
+    cells = grid.to_dict('records') if isinstance(grid, pd.DataFrame) else [dict(cell) for cell in grid]
+    keys = ['inp_type', 'inp_location', 'cyto_location', 'process', 'size']
+    tables = [None] * len(cells)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=_init_sweep, initargs=(cyto_data, uway_bio_data, inp_data, dfs)) as executor:
+        futures = {executor.submit(_correlation_sweep_job, cell, inp_units, method, n_resamples, seed, tolerance, match): i for i, cell in enumerate(cells)}
+        done = 0
+        for future in concurrent.futures.as_completed(futures):
+            i = futures[future]
+            done += 1
+            try:
+                table, error = future.result()
+            except Exception as e:
+                # the worker itself died, e.g. it ran out of memory
+                table, error = None, f'{type(e).__name__}: {e}'
+            label = ' '.join(str(cells[i].get(key)) for key in keys if cells[i].get(key) is not None)
+            if error is None:
+                tables[i] = None if table is None else table.assign(**{key: cells[i].get(key) for key in keys})
+                print(f'[{done}/{len(cells)}] {label}... Done!')
+            else:
+                print(f'[{done}/{len(cells)}] {label}... FAILED ({error})')
+
+    tables = [table for table in tables if table is not None]
+    columns = keys + ['inp_temp', 'variable', 'R', 'p', 'n', 'R^2'] + (['p_permutation', 'R_lower', 'R_upper'] if n_resamples else [])
+    if len(tables) == 0:
+        return pd.DataFrame(columns=columns)
+    return combine_frames(tables, ignore_index=True)[columns]
+
+# LINDA tube holder positions (1-56) used for the unheated (UH) and heated (H) halves of an experiment.
+# Positions 1, 8, 49 and 56 hold the four temperature probes. See the TubeHolderFilling tab of the templates.
+LINDA_POSITIONS = {
+    'UH': numpy.r_[25:29, 33:49, 50:56],
+    'H': numpy.r_[2:8, 9:25, 29:33],
+}
+
+# Temperature steps (*C) of the summary tabs in the calculation templates.
+LINDA_TEMPS = numpy.round(numpy.arange(-1, -18.05, -0.1), 1)
+
+# Column letters of the calculated values in the summary tabs of each calculation template.
+SUMMARY_LAYOUT = {
+    'seawater': [('d','T (*C)'), ('e','N(frozen)'), ('f','BLK'), ('g','N-BLK'), ('h','FrozenFraction'), ('i','Error'),
+                 ('k','T (*C)'), ('l','IN/tube'), ('m','IN/ml'), ('n','IN/ml error'), ('o','IN/L'), ('p','IN/L error'),
+                 ('q','centre adjusted'), ('r','adjusted standard deviation'), ('s','lower_bound'), ('t','upper_bound'),
+                 ('u','lower_N-BLK'), ('v','upper_N-BLK'), ('w','lb_in/tube'), ('x','ub_in/tube')],
+    'aerosol': [('d','T (*C)'), ('e','N(frozen)'), ('f','BLK'), ('g','N-BLK'), ('h','FrozenFraction'), ('i','Error'),
+                ('j','centre adjusted'), ('k','adjusted standard deviation'), ('l','lower_bound'), ('m','upper_bound'),
+                ('n','lower_N-BLK'), ('o','upper_N-BLK'), ('q','IN/L'), ('r','lower INP/L'), ('s','upper INP/L')],
+}
+
+# Parsed calculation templates, keyed by path: (modification time, pickled workbook, data.csv column names)
+_TEMPLATES = {}
+
+def load_template(path):
+    '''
+    Returns a fresh copy of a calculation template workbook and the column names of its data.csv tab.
+
+    Each template is parsed once per process and kept as a pickled workbook; unpickling a copy is about twice as fast as
+    parsing the xlsx again. The template is parsed again when the file's modification time changes.
+
+    Parameters
+    ------------
+    path : str
+        Path to the calculation template. [example: '..\\in_calculation_template.xlsx']
+
+    Returns
+    ------------
+    template : openpyxl workbook
+        A copy of the template that can be filled in and saved.
+    columns : list
+        Column names of the data.csv tab.
+    '''
+    mtime = os.path.getmtime(path)
+    cached = _TEMPLATES.get(path)
+    if cached is None or cached[0] != mtime:
+        workbook = load_workbook(path)
+        columns = [cell.value for cell in workbook['data.csv'][2]]
+        cached = (mtime, pickle.dumps(workbook, protocol=pickle.HIGHEST_PROTOCOL), columns)
+        _TEMPLATES[path] = cached
+    return pickle.loads(cached[1]), list(cached[2])
+
+def read_linda_raw(inpath, chunksize = None, dtype = numpy.float32):
+    '''
+    Reads a raw LINDA data file straight into a datetime64 vector and a numeric array.
+
+    Each line of a raw file holds a quoted timestamp followed by 60 space separated values (the 4 temperature probes and the
+    56 tube intensities) and a trailing space. The trailing empty column is never parsed and the values are read with a fixed dtype.
+
+    Parameters
+    ------------
+    inpath : str
+        Path to the raw LINDA csv file.
+    chunksize : int
+        If given, the file is streamed and an iterator of (times, values) chunks of at most chunksize scans is returned. [DEFAULT = None]
+    dtype : numpy dtype
+        dtype of the values array. [DEFAULT = numpy.float32]
+
+    Returns
+    ------------
+    times : array
+        datetime64[s] timestamp of each scan.
+    values : array
+        Array of shape (scans, 60) where columns are the 4 temperature probes followed by the 56 tube intensities.
+    '''
+    reader = pd.read_csv(inpath, sep=' ', header=None, usecols=range(61), engine='c',
+                         dtype={col: (str if col == 0 else dtype) for col in range(61)}, chunksize=chunksize)
+    if chunksize is not None:
+        return (_linda_arrays(chunk, dtype) for chunk in reader)
+    return _linda_arrays(reader, dtype)
+
+def _linda_arrays(raw, dtype):
+    '''
+    Splits a raw LINDA dataframe into its timestamp vector and values array.
+    '''
+    times = raw[0].to_numpy().astype('datetime64[s]')
+    values = raw.iloc[:, 1:].to_numpy(dtype=dtype)
+    if values.shape[1] != 60:
+        raise ValueError(f'Expected 60 values per scan in a raw LINDA file, found {values.shape[1]}.')
+    return times, values
+
+def linda_raw_frame(times, values, columns):
+    '''
+    Builds the data.csv tab of a calculation template (date, time and the 60 raw values) from :py:func:`read_linda_raw` output.
+
+    Parameters
+    ------------
+    times : array
+        datetime64 timestamp of each scan.
+    values : array
+        Raw values of each scan.
+    columns : list
+        Column names of the data.csv tab of the template.
+
+    Returns
+    ------------
+    raw : df
+        Dataframe with the date and time as strings followed by the raw values.
+    '''
+    stamps = numpy.datetime_as_string(times, unit='s')
+    raw = pd.DataFrame(values, columns=columns[2:])
+    raw.insert(0, columns[0], [stamp[:10] for stamp in stamps])
+    raw.insert(1, columns[1], [stamp[11:] for stamp in stamps])
+    return raw
+
+def write_data_sheet(template, raw):
+    '''
+    Replaces the data.csv tab of a calculation template with raw data in a single pass.
+
+    The header is written to row 2 and the scans from row 3, where the template formulas expect them.
+
+    Parameters
+    ------------
+    template : openpyxl workbook
+        The calculation template.
+    raw : df
+        The data.csv dataframe (see :py:func:`linda_raw_frame`).
+    '''
+    template.remove(template['data.csv'])
+    sheet = template.create_sheet('data.csv')
+    sheet.append([])
+    sheet.append(list(raw.columns))
+    for row in raw.itertuples(index=False, name=None):
+        sheet.append(row)
+
+def save_report(template, outpath, raw = None):
+    '''
+    Saves a calculated report file.
+
+    If raw is given, the data.csv tab is written in write-only (streaming) mode: the rest of the workbook is saved with an
+    empty data.csv tab and the rows are then streamed straight into the sheet XML of the saved file, without creating
+    openpyxl cells. This is much faster and lighter on memory for long runs.
+
+    Parameters
+    ------------
+    template : openpyxl workbook
+        The filled in calculation template.
+    outpath : str
+        Path of the calculated report file.
+    raw : df
+        The data.csv dataframe to stream into the report. If None, the template is saved as is. [DEFAULT = None]
+    '''
+    if raw is None:
+        template.save(outpath)
+        return
+
+    template.remove(template['data.csv'])
+    sheet = template.create_sheet('data.csv')
+    buffer = io.BytesIO()
+    template.save(buffer)
+
+    letters = [get_column_letter(col) for col in range(1, raw.shape[1] + 1)]
+    def text(value):
+        return '<is><t>' + xml_escape(str(value)) + '</t></is>'
+    rows = ['<row r="2">' + ''.join(f'<c r="{letter}2" t="inlineStr">{text(name)}</c>' for letter, name in zip(letters, raw.columns)) + '</row>']
+    for r, values in enumerate(zip(*[raw[col].tolist() for col in raw.columns]), 3):
+        cells = []
+        for letter, value in zip(letters, values):
+            if isinstance(value, str):
+                cells.append(f'<c r="{letter}{r}" t="inlineStr">{text(value)}</c>')
+            elif value is not None and value == value:
+                cells.append(f'<c r="{letter}{r}"><v>{value!r}</v></c>')
+        rows.append(f'<row r="{r}">' + ''.join(cells) + '</row>')
+    sheet_data = ('<sheetData>' + ''.join(rows) + '</sheetData>').encode('utf-8')
+    dimension = f'<dimension ref="A1:{letters[-1]}{raw.shape[0] + 2}" />'.encode('utf-8')
+
+    with zipfile.ZipFile(buffer) as src, zipfile.ZipFile(outpath, 'w', zipfile.ZIP_DEFLATED) as dst:
+        for item in src.infolist():
+            data = src.read(item.filename)
+            if item.filename == sheet.path[1:]:
+                data = re.sub(rb'<sheetData\s*/>|<sheetData>\s*</sheetData>', lambda m: sheet_data, data)
+                data = re.sub(rb'<dimension ref="[^"]*"\s*/>', lambda m: dimension, data)
+            dst.writestr(item, data)
+
+def freezing_temperatures(raw, sensitivity = 0.8, empty_threshold = 0.15):
+    '''
+    Detects the freezing temperature of every tube of a LINDA experiment at once.
+
+    Follows the 'freezepoint detection' tab of the calculation templates: a tube is flagged at a scan when the mean
+    intensity of the 2nd to 4th following scans drops below sensitivity times the mean intensity of the current and 10
+    previous scans. The freezing temperature is the warmest flagged temperature below 0 *C.
+
+    It deliberately deviates from the template in two ways:
+
+    * Glitches: when more than half of the filled tubes dim at once (dims.mean(axis=1) > 0.5), the scans until most tubes have
+      recovered to sensitivity times their pre-dip intensity are treated as an optical glitch, and no tube is flagged at scans
+      whose following window contains one. The template has no such rule; glitches were removed there by hand.
+    * Empty positions: a tube whose maximum intensity stays below empty_threshold is treated as empty and gets no freezing
+      temperature. The template instead uses the positions flagged "VIDE" on its TubeHolderFilling tab, which is not available
+      from the raw data.
+
+    Parameters
+    ------------
+    raw : array
+        Raw LINDA values where rows are scans and columns are the 4 temperature probes followed by the 56 tube intensities.
+    sensitivity : float
+        Detection sensitivity (0.87 - low; 0.95 very high). [DEFAULT = 0.8]
+    empty_threshold : float
+        Tubes whose maximum intensity stays below this value are treated as empty positions. [DEFAULT = 0.15]
+
+    Returns
+    ------------
+    temperature : array
+        Mean probe temperature of each scan.
+    t_freeze : array
+        Freezing temperature of each of the 56 tube positions. NaN for empty positions and tubes that did not freeze.
+    '''
+    raw = numpy.asarray(raw, dtype=float)
+    temperature = numpy.nanmean(raw[:, :4], axis=1)
+    intensity = raw[:, 4:]
+    nscans = intensity.shape[0]
+
+    # running sums give the trailing and leading window means of all tubes without a loop over scans
+    csum = numpy.vstack([numpy.zeros((1, intensity.shape[1])), numpy.cumsum(intensity, axis=0)])
+    k = numpy.arange(nscans)
+    back_lo = numpy.maximum(k - 10, 0)
+    back = (csum[k + 1] - csum[back_lo]) / (k + 1 - back_lo)[:, None]
+    fwd_lo = numpy.minimum(k + 2, nscans)
+    fwd_hi = numpy.minimum(k + 5, nscans)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        fwd = (csum[fwd_hi] - csum[fwd_lo]) / (fwd_hi - fwd_lo)[:, None]
+
+    # scans where most tubes dim at once are optical glitches rather than freezing events. A glitch starts at a scan where
+    # most tubes dim compared with the scan before, and lasts while most tubes stay dimmed compared with that pre-dip scan.
+    # Scans whose leading window contains a glitch are skipped, which is what was otherwise done by hand in the template.
+    filled = numpy.nanmax(intensity, axis=0) >= empty_threshold
+    dims = intensity[1:, filled] < sensitivity * intensity[:-1, filled]
+    start = numpy.r_[False, dims.mean(axis=1) > 0.5]
+    last_start = numpy.maximum.accumulate(numpy.where(start, k, -1))
+    pre_dip = intensity[numpy.maximum(last_start - 1, 0)][:, filled]
+    dimmed = ((intensity[:, filled] < sensitivity * pre_dip).mean(axis=1) > 0.5) & (last_start >= 0)
+    # a dip ends at the first scan where intensity has recovered
+    last_recovered = numpy.maximum.accumulate(numpy.where(dimmed, -1, k))
+    glitch = dimmed & (last_start > last_recovered)
+    gsum = numpy.r_[0, numpy.cumsum(glitch)]
+    skipped = (gsum[fwd_hi] - gsum[fwd_lo]) > 0
+
+    # detection starts once a full trailing window is available, as in the template
+    flagged = (fwd < sensitivity * back) & ((k >= 9) & ~skipped)[:, None]
+    detected = numpy.where(flagged, temperature[:, None], numpy.nan)
+    t_freeze = numpy.fmax.reduce(detected, axis=0)
+
+    t_freeze[t_freeze >= 0] = numpy.nan
+    t_freeze[~filled] = numpy.nan
+    return temperature, t_freeze
+
+def linda_summary(t_freeze, num_tubes, vol_tube = 0.2, blank = None, sigma = 1.96, rinse_vol = None, air_volume = None, temps = LINDA_TEMPS):
+    '''
+    Calculates frozen fraction, blank subtracted N(frozen), INP concentrations and Wilson score bounds of one process (UH or H)
+    for all temperature steps at once.
+
+    Parameters
+    ------------
+    t_freeze : array
+        Freezing temperatures of the tubes of this process. NaN for tubes that did not freeze.
+    num_tubes : int
+        Number of tubes per heated/unheated analysis.
+    vol_tube : float
+        Volume in ml of sample solution per tube. [DEFAULT = 0.2]
+    blank : array
+        N(frozen) of the blank at each temperature step. No blank subtraction if None.
+    sigma : float
+        z value of the Wilson score interval. [DEFAULT = 1.96]
+    rinse_vol : float
+        Volume in ml of mq water used for rinsing filters (aerosol sample types only).
+    air_volume : float
+        Total volume of air sampled in liters (aerosol sample types only).
+    temps : array
+        Temperature steps in *C. [DEFAULT = LINDA_TEMPS]
+
+    Returns
+    ------------
+    summary : df
+        A dataframe with one row per temperature step and columns named as in the summary tabs of the calculation templates.
+        IN/ml is given for every sample. When rinse_vol is given, IN/L is INP per liter of air (NaN without air_volume).
+        Where the Wilson score interval is undefined (e.g. a frozen fraction below 0 after blank subtraction) the bounds are 0,
+        as in :py:func:`wilson_interval`.
+    '''
+    t_freeze = numpy.asarray(t_freeze, dtype=float)
+    temps = numpy.asarray(temps, dtype=float)
+    n = num_tubes
+    z = sigma
+
+    # tubes frozen at each temperature step, i.e. number of freezing temperatures warmer than the step
+    n_frozen = (t_freeze[None, :] > temps[:, None]).sum(axis=1)
+    blk = numpy.zeros(len(temps)) if blank is None else numpy.asarray(blank, dtype=float)
+    n_blk = n_frozen - blk
+    ff = n_blk / n
+
+    # Wilson score bounds (0 where the interval is undefined, see wilson_interval) and the template columns they come from
+    centre = ff + z*z / (2*n)
+    lower, upper = wilson_interval(ff, n, z)
+    adj_std = (upper - lower) * (1 + z*z/n) / (2*z)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        in_tube = numpy.log(n) - numpy.log(n - n_blk)
+        summary = pd.DataFrame({
+            'T (*C)': temps,
+            'N(frozen)': n_frozen,
+            'BLK': blk,
+            'N-BLK': n_blk,
+            'FrozenFraction': ff,
+            'Error': numpy.sqrt(n_blk) / n,
+            'IN/tube': in_tube,
+            'IN/ml': in_tube / vol_tube,
+            'IN/ml error': (1/(n - n_blk)) * (1/vol_tube) * numpy.sqrt(n_blk),
+            'centre adjusted': centre,
+            'adjusted standard deviation': adj_std,
+            'lower_bound': lower,
+            'upper_bound': upper,
+            'lower_N-BLK': lower*n,
+            'upper_N-BLK': upper*n,
+            'lb_in/tube': numpy.log(n) - numpy.log(n - lower*n),
+            'ub_in/tube': numpy.log(n) - numpy.log(n - upper*n),
+        })
+        summary['IN/L'] = summary['IN/ml']*1000
+        summary['IN/L error'] = summary['IN/ml error']*1000
+
+        # aerosol samples are reported per liter of air rather than per liter of solution
+        if rinse_vol is not None:
+            factor = rinse_vol / (air_volume * vol_tube) if air_volume else numpy.nan
+            summary['IN/L'] = summary['IN/tube'] * factor
+            summary['lower INP/L'] = summary['lb_in/tube'] * factor
+            summary['upper INP/L'] = summary['ub_in/tube'] * factor
+
+    return summary
+
+def calculate_linda(raw, num_tubes, vol_tube = 0.2, blank = None, sigma = 1.96, rinse_vol = None, air_volume = None,
+                    sensitivity = 0.8, temps = LINDA_TEMPS):
+    '''
+    Calculates the unheated and heated INP summaries of a LINDA experiment directly from the raw data, without the Excel template.
+
+    Parameters
+    ------------
+    raw : array or df
+        Raw LINDA values where rows are scans and columns are the 4 temperature probes followed by the 56 tube intensities.
+    num_tubes : int
+        Number of tubes per heated/unheated analysis.
+    vol_tube : float
+        Volume in ml of sample solution per tube. [DEFAULT = 0.2]
+    blank : dict
+        N(frozen) of the blank at each temperature step, keyed by process. [UH, H]
+    sigma : float
+        z value of the Wilson score interval. [DEFAULT = 1.96]
+    rinse_vol : float
+        Volume in ml of mq water used for rinsing filters (aerosol sample types only).
+    air_volume : float
+        Total volume of air sampled in liters (aerosol sample types only).
+    sensitivity : float
+        Freezing detection sensitivity. [DEFAULT = 0.8]
+    temps : array
+        Temperature steps in *C. [DEFAULT = LINDA_TEMPS]
+
+    Returns
+    ------------
+    summaries : dict
+        Summary dataframe of each process (see linda_summary), keyed by process. [UH, H]
+    t_freeze : array
+        Freezing temperature of each of the 56 tube positions.
+    '''
+    temperature, t_freeze = freezing_temperatures(raw, sensitivity)
+    summaries = {}
+    for process, positions in LINDA_POSITIONS.items():
+        summaries[process] = linda_summary(
+            t_freeze[positions - 1], num_tubes, vol_tube, None if blank is None else blank[process],
+            sigma, rinse_vol, air_volume, temps)
+    return summaries, t_freeze
+
+def write_summary(sheet, summary, t_freeze, process, layout):
+    '''
+    Writes calculated values into a summary tab of a calculation template, replacing the template formulas.
+
+    Parameters
+    ------------
+    sheet : openpyxl worksheet
+        The summary_UF_UH or summary_UF_H tab of the template.
+    summary : df
+        The summary dataframe of the process (see linda_summary).
+    t_freeze : array
+        Freezing temperature of each of the 56 tube positions.
+    process : str
+        [UH, H]
+    layout : str
+        Template layout. [seawater, aerosol]
+    '''
+    # freezing temperature of each tube of this process, listed by tube position
+    for position in LINDA_POSITIONS[process]:
+        value = t_freeze[position - 1]
+        sheet['b'][position].value = float(value) if numpy.isfinite(value) else None
+
+    for letter, name in SUMMARY_LAYOUT[layout]:
+        if name not in summary:
+            continue
+        column = sheet[letter]
+        row = 1
+        for value in summary[name]:
+            column[row].value = float(value) if numpy.isfinite(value) else None
+            row += 1
+
+def summary_table(sheet):
+    '''
+    Reads the summary table (the columns left of the metadata) of a filled in summary tab of a calculation template.
+
+    Columns are named as pd.read_excel would name them (repeated names get a .1, .2... suffix). Cells still holding template
+    formulas are returned as NaN.
+
+    Parameters
+    ------------
+    sheet : openpyxl worksheet
+        The summary_UF_UH or summary_UF_H tab.
+
+    Returns
+    ------------
+    table : df
+        The summary table.
+    '''
+    return _split_summary(sheet.iter_rows(values_only=True))[0]
+
+def _split_summary(rows):
+    '''
+    Splits the rows of a summary tab into the summary table and the metadata dict next to it.
+    '''
+    rows = [tuple(row) for row in rows]
+    end = rows[0].index('raw data source')
+    def cell(row, i):
+        return row[i] if i < len(row) else None
+
+    names = []
+    counts = {}
+    for i, name in enumerate(rows[0][:end]):
+        if name is None:
+            continue
+        counts[name] = counts.get(name, -1) + 1
+        names.append((i, name if counts[name] == 0 else f'{name}.{counts[name]}'))
+    data = [[cell(row, i) for i, _ in names] for row in rows[1:]]
+    while data and all(value is None for value in data[-1]):
+        data.pop()
+    table = pd.DataFrame(data, columns=[name for _, name in names])
+
+    meta_dict = {}
+    for row in rows:
+        if cell(row, end) is not None:
+            meta_dict[cell(row, end)] = cell(row, end + 1)
+    return table.apply(pd.to_numeric, errors='coerce'), meta_dict
+
+def report_table_path(path):
+    '''
+    Returns the path of the Parquet copy of a calculated report file (same name, .parquet extension).
+    '''
+    return os.path.splitext(path)[0] + '.parquet'
+
+def _file_sha1(path):
+    '''
+    Returns the SHA-1 hex digest of the contents of a file.
+    '''
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def save_report_table(template, meta_dict, outpath, source_sha1 = None):
+    '''
+    Saves the summary_UF_UH and summary_UF_H tables of a calculated report file to a columnar Parquet file.
+
+    Both tables are stored in one file with a process column [UH, H]. The metadata dict is stored as JSON in the schema metadata
+    under the key pyce_tools, and the SHA-1 of the XLSX report file under the key pyce_tools_source. Requires pyarrow.
+
+    Parameters
+    ------------
+    template : openpyxl workbook
+        The filled in calculation template.
+    meta_dict : dict
+        Metadata of the report file.
+    outpath : str
+        Path of the Parquet file. See :py:func:`report_table_path`.
+    source_sha1 : str
+        SHA-1 of the saved XLSX report file. :py:func:`read_report` only uses the Parquet copy while it matches the XLSX file,
+        so a copy saved without it is never used. [DEFAULT = None]
+    '''
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Columnar report output requires pyarrow. Install it or set columnar=False.')
+    tables = [summary_table(template['summary_UF_'+proc]).assign(process=proc) for proc in ['UH', 'H']]
+    table = pyarrow.Table.from_pandas(pd.concat(tables, ignore_index=True), preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[b'pyce_tools'] = json.dumps(meta_dict, default=str).encode('utf-8')
+    if source_sha1 is not None:
+        metadata[b'pyce_tools_source'] = source_sha1.encode('utf-8')
+    pyarrow.parquet.write_table(table.replace_schema_metadata(metadata), outpath)
+
+def _read_report_file(path, sha1 = None):
+    '''
+    Loads the summary tables and metadata of one calculated report file. See :py:func:`read_report`.
+    '''
+    columnar = report_table_path(path)
+    if os.path.exists(columnar):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            pass
+        else:
+            table = pyarrow.parquet.read_table(columnar)
+            # only use the copy written from the current XLSX file, not one left by a rerun without columnar or an edit in Excel
+            if (table.schema.metadata or {}).get(b'pyce_tools_source', b'').decode('utf-8') == (sha1 or _file_sha1(path)):
+                meta_dict = json.loads(table.schema.metadata[b'pyce_tools'])
+                df = table.to_pandas()
+                tables = {proc: group.drop(columns='process').reset_index(drop=True) for proc, group in df.groupby('process', sort=False)}
+                return tables, meta_dict
+
+    # open the workbook once, read only, and parse just the two summary tabs
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        tables = {}
+        for proc in ['UH', 'H']:
+            tables[proc], meta_dict = _split_summary(workbook['summary_UF_'+proc].iter_rows(values_only=True))
+    finally:
+        workbook.close()
+    return tables, meta_dict
+
+def read_report(path, max_workers = None, sha1 = None):
+    '''
+    Loads the summary tables and metadata of calculated report files.
+
+    If a Parquet copy of a report exists (see :py:func:`save_report_table`) and the SHA-1 of the XLSX file it was written from matches
+    the XLSX file on disk, it is read instead of the XLSX file, which is much faster. A stale copy is ignored.
+    Otherwise the XLSX file is opened once, read only, and only the two summary tabs are parsed.
+
+    Parameters
+    ------------
+    path : str or list
+        Path of a calculated report file (xlsx), or a list of paths. A list is read in parallel on a process pool.
+    max_workers : int
+        Number of worker processes used for a list of paths. Defaults to the number of processors on the machine.
+    sha1 : str or list
+        SHA-1 of the XLSX file (one per path for a list of paths), if already known, to check the Parquet copy against instead of
+        hashing the XLSX file again. [DEFAULT = None]
+
+    Returns
+    ------------
+    tables : dict
+        Summary table of each process, keyed by UH and H.
+    meta_dict : dict
+        Metadata of the report file.
+
+    A list of (tables, meta_dict) tuples, in the order of the paths, is returned for a list of paths.
+    '''
+    if isinstance(path, str):
+        return _read_report_file(path, sha1)
+    paths = list(path)
+    hashes = list(sha1) if sha1 is not None else [None] * len(paths)
+    if len(paths) < 2:
+        return [_read_report_file(p, h) for p, h in zip(paths, hashes)]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_read_report_file, paths, hashes))
+
+def calculate_raw_blank(type_, process, location, sample_name, collection_date, analysis_date, issues, num_tubes, vol_tube = 0.2, rinse_vol = 20, size = None,
+                        sensitivity = 0.8, write_only = False, columnar = False):
     '''
     Loads raw data from LINDA BLANK experiments and creates a 'calculated' INP data file using given arguments.
     Saves the output as an XLSX file which can be later used as the blank in sample calculations of LINDA experiments.
@@ -386,11 +1381,18 @@ def calculate_raw_blank(type_, process, location, sample_name, collection_date,
         Volume in ml of mq water used for rinsing filters, if the sample type makes use of a filter.
     size : str
         Size of particles for filter samples if sample was size resolved. [super, sub]
+    sensitivity : float
+        Freezing detection sensitivity (0.87 - low; 0.95 very high). [DEFAULT = 0.8]
+    write_only : bool
+        Stream the raw data into the data.csv tab while saving instead of building it in memory. Faster for long runs. [DEFAULT = False]
+    columnar : bool
+        Also save the summary tables and metadata to a Parquet file next to the report (requires pyarrow). Downstream readers use it instead of the XLSX file while the two match.
+        With columnar=False an existing Parquet copy is deleted. [DEFAULT = False]
     
     Returns
     ------------
     xlsx
-        A spreadsheet of calculated blank data.
+        A spreadsheet of calculated blank data. Summary tabs hold calculated values, so the file can be read without opening it in Excel.
     
     Notes
     ------------
@@ -403,25 +1405,17 @@ def calculate_raw_blank(type_, process, location, sample_name, collection_date,
     if type_ == 'mq':
         date = collection_date[:6]
         inpath = '..\\data\\raw\\IN\\blank\\' + location + '_'+ 'blank' + '_' + process + '_' + date + '.csv'
-        template = pd.read_excel('..\\in_calculation_template.xlsx', skiprows=1)
+        template, columns = load_template('..\\in_calculation_template.xlsx')
     
     if type_ == 'aerosol':
         date = collection_date[:6]
         inpath = '..\\data\\raw\\IN\\blank\\' + location + '_'+ 'blank' + '_' + process + '_' + size + '_' + date + '.csv'
-        template = pd.read_excel('..\\in_calculation_template_aerosols.xlsx', skiprows=1)
-    
-    raw = pd.read_csv(inpath, sep = ' ', header = None, parse_dates=False)
-    
-    # create a datetime df to split up the date and time into separate columns, then insert them into the raw spreadsheet
-    datetime_col = raw[0].str.split(' ', expand=True)
-    raw.insert(0, 'day',datetime_col[0])
-    raw[0]=datetime_col[1]
-    
-    # drop the random extra column at the end
-    raw=raw.drop(columns=61)
+        template, columns = load_template('..\\in_calculation_template_aerosols.xlsx')
     
-    # set the column names so they match those in the template
-    raw.columns = template.columns
+    # read the raw data with the date and time in separate columns, named so they match those in the template.
+    # values are kept as float64 so the data.csv tab holds exactly the raw values.
+    times, values = read_linda_raw(inpath, dtype=numpy.float64)
+    raw = linda_raw_frame(times, values, columns)
     
     # create metadata dict depending on sample type
     if type_ == 'mq_wboat' or type_ == 'mq':
@@ -453,16 +1447,9 @@ def calculate_raw_blank(type_, process, location, sample_name, collection_date,
         }
     
     
-    # insert the raw data into the template 
-    if type_ == 'mq_wboat' or type_ == 'mq':
-        template = load_workbook('..\\in_calculation_template.xlsx')
-    if type_ == 'aerosol':
-        template = load_workbook('..\\in_calculation_template_aerosols.xlsx')
-    template.remove(template["data.csv"])
-    sheet = template.create_sheet('data.csv')
-    for row in dataframe_to_rows(raw, index=False, header=True):
-        sheet.append(row)
-    sheet.insert_rows(idx=0)
+    # insert the raw data into the template. In write only mode it is streamed into the file when the report is saved.
+    if not write_only:
+        write_data_sheet(template, raw)
     
     # add metadata to spreadsheet
     if type_ == 'aerosol':
@@ -481,17 +1468,34 @@ def calculate_raw_blank(type_, process, location, sample_name, collection_date,
             template['summary_UF_H']['z'][row].value = key
             template['summary_UF_H']['aa'][row].value = value
             row +=1
+
+    # calculate the summary tabs from the raw data instead of relying on the template formulas
+    if type_ == 'aerosol':
+        summaries, t_freeze = calculate_linda(raw.iloc[:, 2:], num_tubes, vol_tube, rinse_vol=rinse_vol, sensitivity=sensitivity)
+        layout = 'aerosol'
+    if type_ == 'mq_wboat' or type_ == 'mq':
+        summaries, t_freeze = calculate_linda(raw.iloc[:, 2:], num_tubes, vol_tube, sensitivity=sensitivity)
+        layout = 'seawater'
+    for proc in ['UH', 'H']:
+        write_summary(template['summary_UF_'+proc], summaries[proc], t_freeze, proc, layout)
+
     # save calculated report file to the appropriate folder
     if type_ == 'mq_wboat' or type_ == 'mq':
-        template.save('..\\data\\interim\\IN\\calculated\\blank\\'+type_ + '_'+'blank'+'_' + process + '_' + date+'_calculated.xlsx')
+        save_path = '..\\data\\interim\\IN\\calculated\\blank\\'+type_ + '_'+'blank'+'_' + process + '_' + date+'_calculated.xlsx'
     if type_ == 'aerosol':
-        template.save('..\\data\\interim\\IN\\calculated\\blank\\'+location + '_'+'blank'+'_' + process + '_' + size + '_'+ date + '_calculated.xlsx')
+        save_path = '..\\data\\interim\\IN\\calculated\\blank\\'+location + '_'+'blank'+'_' + process + '_' + size + '_'+ date + '_calculated.xlsx'
+    save_report(template, save_path, raw if write_only else None)
+    if columnar:
+        save_report_table(template, meta_dict, report_table_path(save_path), _file_sha1(save_path))
+    elif os.path.exists(report_table_path(save_path)):
+        # remove the copy of an earlier columnar run so it can't be mistaken for this one
+        os.remove(report_table_path(save_path))
     
     return print('...Raw blank data calculated!')
 
 def calculate_raw(blank_source, type_, location, process, sample_name, 
                   collection_date, analysis_date, issues, num_tubes, vol_tube = 0.2, rinse_vol = 20, size = None,
-                  flow_start = None, flow_stop = None, sample_stop_time = None):
+                  flow_start = None, flow_stop = None, sample_stop_time = None, sensitivity = 0.8, write_only = False, columnar = False):
     '''
     Calculates raw data.
     
@@ -531,6 +1535,13 @@ def calculate_raw(blank_source, type_, location, process, sample_name,
         Flow rate in LPM at end of sampling. Only used for aerosol samples.
     sample_stop_time : str
         Time in NZST at which sample collection was halted. Only valid for aerosol collections. [DDMMYYYY HHhMM]
+    sensitivity : float
+        Freezing detection sensitivity (0.87 - low; 0.95 very high). [DEFAULT = 0.8]
+    write_only : bool
+        Stream the raw data into the data.csv tab while saving instead of building it in memory. Faster for long runs. [DEFAULT = False]
+    columnar : bool
+        Also save the summary tables and metadata to a Parquet file next to the report (requires pyarrow). Downstream readers use it instead of the XLSX file while the two match.
+        With columnar=False an existing Parquet copy is deleted. [DEFAULT = False]
     
     Notes
     ------------
@@ -598,7 +1609,7 @@ def calculate_raw(blank_source, type_, location, process, sample_name,
         # use input parameters to build path to source file
         inpath = '..\\data\\raw\\IN\\' + type_ + '\\' + type_ + '_' + location + '_' + process + '_' + date + '_' + time + '.csv'
         # load analysis template
-        template = pd.read_excel('..\\in_calculation_template.xlsx', skiprows=1)
+        template, columns = load_template('..\\in_calculation_template.xlsx')
     
     if type_ == 'aerosol':
         if location == 'bubbler':
@@ -608,29 +1619,19 @@ def calculate_raw(blank_source, type_, location, process, sample_name,
             # use input parameters to build path to source file
             inpath = '..\\data\\raw\\IN\\' + type_ + '\\' + type_ + '_' + location + '_' + process + '_' + size + '_'+ date + '_' + time + '.csv'
             # load analysis template
-            template = pd.read_excel('..\\in_calculation_template_aerosols.xlsx', skiprows=1)
+            template, columns = load_template('..\\in_calculation_template_aerosols.xlsx')
         if location == 'coriolis':
             # extract date and time from input parameters
             date = coriolis_day_date[collection_date]
             # use input parameters to build path to source file
             inpath = '..\\data\\raw\\IN\\' + type_ + '\\' + type_ + '_' + location + '_' + process + '_' + date + '.csv'
             # load analysis template
-            template = pd.read_excel('..\\in_calculation_template_aerosols.xlsx', skiprows=1)
-    
-    # read in the raw data csv
-    raw = pd.read_csv(inpath, sep = ' ', header = None, parse_dates=False)
+            template, columns = load_template('..\\in_calculation_template_aerosols.xlsx')
     
-
-    # create a datetime df to split up the date and time into separate columns, then insert them
-    datetime_col = raw[0].str.split(' ', expand=True)
-    raw.insert(0, 'day',datetime_col[0])
-    raw[0]=datetime_col[1]
-
-    # drop the extra empty column at the end of every data file
-    raw=raw.drop(columns=61)
-    
-    # set the column names so they match those in the template
-    raw.columns = template.columns
+    # read in the raw data csv with the date and time in separate columns, named so they match those in the template.
+    # values are kept as float64 so the data.csv tab holds exactly the raw values.
+    times, values = read_linda_raw(inpath, dtype=numpy.float64)
+    raw = linda_raw_frame(times, values, columns)
 
     # create metadata dict depending on sample type
     if type_== 'seawater':
@@ -676,16 +1677,9 @@ def calculate_raw(blank_source, type_, location, process, sample_name,
         meta_dict['sigma'] = 1.96
 
     
-    # insert the raw data into the template 
-    if type_ == 'seawater':
-        template = load_workbook('..\\in_calculation_template.xlsx')
-    if type_ == 'aerosol':
-        template = load_workbook('..\\in_calculation_template_aerosols.xlsx')
-    template.remove(template["data.csv"])
-    sheet = template.create_sheet('data.csv')
-    for row in dataframe_to_rows(raw, index=False, header=True):
-        sheet.append(row)
-    sheet.insert_rows(idx=0)
+    # insert the raw data into the template. In write only mode it is streamed into the file when the report is saved.
+    if not write_only:
+        write_data_sheet(template, raw)
     
     
     # add metadata to spreadsheet - one in each of the two process sheets (UF_UH and UF_H)
@@ -708,8 +1702,9 @@ def calculate_raw(blank_source, type_, location, process, sample_name,
     
     
     # read and add blank data.
-    blank_uf_uh = pd.read_excel(blank_source, sheet_name='summary_UF_UH')
-    blank_uf_h = pd.read_excel(blank_source, sheet_name='summary_UF_H')
+    blank_tables, _ = read_report(blank_source)
+    blank_uf_uh = blank_tables['UH']
+    blank_uf_h = blank_tables['H']
     row = 1
     for x in blank_uf_uh['N(frozen)']:
         template['summary_UF_UH']['f'][row].value = x
@@ -719,164 +1714,640 @@ def calculate_raw(blank_source, type_, location, process, sample_name,
         template['summary_UF_H']['f'][row].value = x
         row += 1
     
+    # calculate the blank corrected summary tabs from the raw data instead of relying on the template formulas
+    blank = {
+        'UH': blank_uf_uh['N(frozen)'].iloc[:len(LINDA_TEMPS)].fillna(0).to_numpy(),
+        'H': blank_uf_h['N(frozen)'].iloc[:len(LINDA_TEMPS)].fillna(0).to_numpy(),
+    }
+    if type_ == 'seawater':
+        summaries, t_freeze = calculate_linda(raw.iloc[:, 2:], num_tubes, vol_tube, blank, meta_dict['sigma'], sensitivity=sensitivity)
+        layout = 'seawater'
+    if type_ == 'aerosol':
+        summaries, t_freeze = calculate_linda(raw.iloc[:, 2:], num_tubes, vol_tube, blank, meta_dict['sigma'],
+                                              rinse_vol, meta_dict['total air volume'], sensitivity)
+        layout = 'aerosol'
+    for proc in ['UH', 'H']:
+        write_summary(template['summary_UF_'+proc], summaries[proc], t_freeze, proc, layout)
+    
+    
+    # Save output depending on IN type
+    if type_ == 'seawater':
+        save_path = '..\\data\\interim\\IN\\calculated\\'+type_+'\\'+location+'\\'+type_ + '_' + location + '_' + process + '_' + date + '_' + time +'_calculated.xlsx'
+    if type_ == 'aerosol':
+        if location == 'bubbler':
+            save_path = '..\\data\\interim\\IN\\calculated\\'+type_+'\\'+location+'\\'+type_ + '_' + location + '_' + process + '_' + size + '_' + date + '_' + time + '_calculated.xlsx'
+        if location == 'coriolis':
+            save_path = '..\\data\\interim\\IN\\calculated\\'+type_+'\\'+location+'\\'+type_ + '_' + location + '_' + process  + '_' + date+'_calculated.xlsx'
+    save_report(template, save_path, raw if write_only else None)
+    if columnar:
+        save_report_table(template, meta_dict, report_table_path(save_path), _file_sha1(save_path))
+    elif os.path.exists(report_table_path(save_path)):
+        # remove the copy of an earlier columnar run so it can't be mistaken for this one
+        os.remove(report_table_path(save_path))
+
+    return print(f'...IN data calculated!\nCalculated report file saved to {save_path}.')
+
+def _manifest_bool(value):
+    '''
+    Converts a manifest value (a bool from YAML, or a string such as True, false, yes or 0 from CSV) to a bool.
+    '''
+    if isinstance(value, str):
+        if value.strip().lower() in ['true', 'yes', '1']:
+            return True
+        if value.strip().lower() in ['false', 'no', '0']:
+            return False
+        raise ValueError(f'Invalid manifest value {value}. Use True or False.')
+    return bool(value)
+
+# calculate_raw arguments that can be given in a batch manifest, with the type each manifest value is converted to.
+MANIFEST_FIELDS = {
+    'blank_source': str,
+    'type_': str,
+    'location': str,
+    'process': str,
+    'sample_name': str,
+    'collection_date': str,
+    'analysis_date': str,
+    'issues': str,
+    'num_tubes': int,
+    'vol_tube': float,
+    'rinse_vol': float,
+    'size': str,
+    'flow_start': float,
+    'flow_stop': float,
+    'sample_stop_time': str,
+    'sensitivity': float,
+    'write_only': _manifest_bool,
+    'columnar': _manifest_bool,
+}
+
+def load_manifest(manifest):
+    '''
+    Loads a manifest of samples for :py:func:`calculate_raw_batch`.
+
+    Parameters
+    ------------
+    manifest : str, df or list
+        Path to a CSV or YAML (.yml, .yaml) file, a dataframe, or a list of dicts. Each row/entry describes one sample using
+        the argument names of calculate_raw (blank_source, type_, location, process, sample_name, collection_date, analysis_date,
+        issues, num_tubes, vol_tube, rinse_vol, size, flow_start, flow_stop, sample_stop_time, sensitivity, write_only, columnar).
+        sensitivity is a float; write_only and columnar are True or False. Empty values use the calculate_raw defaults.
+
+    Returns
+    ------------
+    samples : list
+        A list of keyword argument dicts, one per sample.
+    '''
+    if isinstance(manifest, str):
+        if manifest.endswith(('.yml', '.yaml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError('Reading YAML manifests requires PyYAML. Install it or use a CSV manifest.')
+            with open(manifest) as f:
+                entries = yaml.safe_load(f)
+        else:
+            entries = pd.read_csv(manifest, dtype=str, keep_default_na=False).to_dict('records')
+    elif isinstance(manifest, pd.DataFrame):
+        entries = manifest.to_dict('records')
+    else:
+        entries = list(manifest)
+
+    samples = []
+    for entry in entries:
+        kwargs = {}
+        for key, value in entry.items():
+            if key not in MANIFEST_FIELDS:
+                raise ValueError(f'Unknown manifest column {key}. Valid columns are {list(MANIFEST_FIELDS)}.')
+            if value is None or (isinstance(value, float) and math.isnan(value)) or value == '':
+                continue
+            kwargs[key] = MANIFEST_FIELDS[key](value)
+        samples.append(kwargs)
+    return samples
+
+def _calculate_raw_job(kwargs):
+    '''
+    Runs calculate_raw for one manifest entry and returns the error message instead of raising.
+    '''
+    try:
+        calculate_raw(**kwargs)
+        return None
+    except Exception as e:
+        return f'{type(e).__name__}: {e}'
+
+def calculate_raw_batch(manifest, max_workers = None):
+    '''
+    Creates calculated report files for every sample in a manifest, running :py:func:`calculate_raw` in parallel on a process pool.
+
+    A sample that fails (missing or malformed raw file, bad metadata) is reported and skipped; the rest of the batch continues.
+
+    Parameters
+    ------------
+    manifest : str, df or list
+        Samples to calculate. See :py:func:`load_manifest`.
+    max_workers : int
+        Number of worker processes. Defaults to the number of processors on the machine.
+
+    Returns
+    ------------
+    results : df
+        One row per sample with its type, location, process, size, collection date, sample name, status (ok or failed) and error message.
+
+    Examples
+    ---------
+    A CSV manifest has one line per sample, with columns named after the calculate_raw parameters.
+
+    >>> results = pt.calculate_raw_batch('..\\data\\raw\\IN\\manifest.csv')
+    [1/2] aerosol bubbler sub 17032020 11h25... Done!
+    [2/2] aerosol bubbler sub 18032020 10h05... FAILED (FileNotFoundError: ...)
+    '''
+    samples = load_manifest(manifest)
+    errors = [None] * len(samples)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_calculate_raw_job, kwargs): i for i, kwargs in enumerate(samples)}
+        done = 0
+        for future in concurrent.futures.as_completed(futures):
+            i = futures[future]
+            done += 1
+            try:
+                errors[i] = future.result()
+            except Exception as e:
+                # the worker itself died, e.g. it ran out of memory
+                errors[i] = f'{type(e).__name__}: {e}'
+            label = ' '.join(str(samples[i].get(key)) for key in ['type_', 'location', 'size', 'collection_date'] if samples[i].get(key))
+            if errors[i] is None:
+                print(f'[{done}/{len(samples)}] {label}... Done!')
+            else:
+                print(f'[{done}/{len(samples)}] {label}... FAILED ({errors[i]})')
+
+    results = pd.DataFrame([
+        {key: kwargs.get(key) for key in ['type_', 'location', 'process', 'size', 'collection_date', 'sample_name']}
+        for kwargs in samples])
+    results['status'] = ['ok' if error is None else 'failed' for error in errors]
+    results['error'] = errors
+    print(f'...{(results.status == "ok").sum()} of {len(samples)} samples calculated!')
+    return results
+
+def combine_frames(frames, dtypes = None, ignore_index = False):
+    '''
+    Combines dataframes collected in a list into one dataframe with a single concatenation.
+
+    Used instead of growing a dataframe with repeated appends inside a loop, which copies all of the data on every
+    iteration (and DataFrame.append no longer exists in pandas 2).
+
+    Parameters
+    ------------
+    frames : list
+        The dataframes to combine, in order.
+    dtypes : dict
+        Column dtypes of the combined dataframe, if known in advance. Columns not listed keep their inferred dtype. [DEFAULT = None]
+    ignore_index : bool
+        Number the rows of the combined dataframe 0, 1, ..., n - 1 instead of keeping the index of each frame. [DEFAULT = False]
+
+    Returns
+    ------------
+    combined : df
+        The combined dataframe. Empty if no frames were given.
+    '''
+    if len(frames) == 0:
+        return pd.DataFrame()
+    combined = pd.concat(frames, ignore_index=ignore_index)
+    if dtypes:
+        combined = combined.astype({column: dtype for column, dtype in dtypes.items() if column in combined.columns})
+    return combined
+
+def _clean_report(tables, meta_dict, type_, location):
+    '''
+    Transforms the summary tables of one calculated report file into rows of the combined time series (one per process).
+    '''
+    frames = []
+    
+    # account for unheated and heated processes
+    procs = ['UH','H']
+
+    if type_=='seawater':
+        
+        for process in procs:
+            
+            # load the file
+            df = tables[process].copy()
+            
+            # rename annoying column names
+            df['T (*C)'] =df['T (*C)'].round(1)
+            
+            # create transposed df and give it appropriate column names
+            fd = df.T
+            fd.columns = fd.loc['T (*C)',:]
+            
+            # add data to dataframe
+            current = fd.loc[['IN/ml'],:].reset_index(drop=True)
+            current['datetime'] = meta_dict['sample collection date']
+            current['time'] = current['datetime'].iloc[0][9:]
+            
+            # turn columns into strings so they aren't ints
+            current.columns = current.columns.astype(str)
+            
+            # add label data
+            current['process'] = process
+            current['type'] = type_
+            current['location'] = location
+            current['filtered'] = 'uf'
+            
+            # add this to the final dataframe
+            frames.append(current)
     
-    # Save output depending on IN type
-    if type_ == 'seawater':
-        template.save('..\\data\\interim\\IN\\calculated\\'+type_+'\\'+location+'\\'+type_ + '_' + location + '_' + process + '_' + date + '_' + time +'_calculated.xlsx')
-        save_path = '..\\data\\interim\\IN\\calculated\\'+type_+'\\'+location+'\\'+type_ + '_' + location + '_' + process + '_' + date + '_' + time +'_calculated.xlsx'
-    if type_ == 'aerosol':
-        if location == 'bubbler':
-            template.save('..\\data\\interim\\IN\\calculated\\'+type_+'\\'+location+'\\'+type_ + '_' + location + '_' + process + '_' + size + '_' + date + '_' + time + '_calculated.xlsx')
-            save_path = '..\\data\\interim\\IN\\calculated\\'+type_+'\\'+location+'\\'+type_ + '_' + location + '_' + process + '_' + size + '_' + date + '_' + time + '_calculated.xlsx'
-        if location == 'coriolis':
-            template.save('..\\data\\interim\\IN\\calculated\\'+type_+'\\'+location+'\\'+type_ + '_' + location + '_' + process  + '_' + date+'_calculated.xlsx')
-            save_path = '..\\data\\interim\\IN\\calculated\\'+type_+'\\'+location+'\\'+type_ + '_' + location + '_' + process  + '_' + date+'_calculated.xlsx'
+    elif type_ == 'aerosol' and location == 'bubbler':
+        
+        for process in procs:
+            
+            # load the file
+            df = tables[process].copy()
+            
+            # rename annoying column names
+            df['T (*C)'] =df['T (*C)'].round(1)
+            
+            # create transposed df and give it appropriate column names
+            fd = df.T
+            fd.columns = fd.loc['T (*C)',:]
+            
+            # add data to current
+            current = fd.loc[['IN/L'],:].reset_index(drop=True)
+            current['datetime'] = meta_dict['sample collection date'][0:14]
+            current['start_date'] = meta_dict['sample collection date'][0:14]
+            current['stop_date'] = meta_dict['sample collection date'][21:]
+
+            # turn columns into strings so they aren't ints
+            current.columns = current.columns.astype(str)
+
+            # add label data
+            if meta_dict.get('size') in ['super', 'sub']:
+                current['size'] = meta_dict['size']
+            current['process'] = process
+            current['type'] = type_
+            current['location'] = location
+            current['filtered'] = 'uf'
+            
+            # add this to the final big_df
+            frames.append(current)
     
+    elif type_=='aerosol' and location == 'coriolis':
+        
+        for process in procs:
+            
+            # load the file
+            df = tables[process].copy()
+            # rename annoying column names
+            df['T (*C)'] =df['T (*C)'].round(1)
+            # create transposed df and give it appropriate column names
+            fd = df.T
+            fd.columns = fd.loc['T (*C)',:]
+            
+            # add data to current
+            current = fd.loc[['IN/L (INP per liter of air)'],:].reset_index(drop=True)
+            current['date'] = meta_dict['sample collection date']
+            current['hour'] = current['date'].iloc[0][9:]
+            current['start_date'] = current.loc[0,'date'][0:14]
+            current['stop_date'] = current.loc[0,'date'][23:]
+            
+            # add label data
+            if meta_dict.get('size') in ['super', 'sub']:
+                current['size'] = meta_dict['size']
 
-    return print(f'...IN data calculated!\nCalculated report file saved to {save_path}.')
+            # turn columns into strings so they aren't ints
+            current.columns = current.columns.astype(str)
+            current['process'] = process
+            
+            # add this to the final big_df
+            frames.append(current)
 
-def clean_calculated_in(type_, location):
+    return frames
+
+def _report_errors(tables, meta_dict, type_, location):
+    '''
+    Calculates Wilson score error bars of one calculated report file in long form, one row per process and temperature.
+
+    Concentrations are in the units of the combined time series: IN/ml for seawater and IN/L (of air) for aerosol samples.
+    Sample information comes from the report metadata.
+    '''
+    num_tubes = meta_dict.get('# tubes', 26)
+    sigma = meta_dict.get('sigma', 1.96)
+    frames = []
+    for process in ['UH','H']:
+        df = tables[process]
+        error = pd.DataFrame({'temp': df['T (*C)'].round(1)})
+        if type_ == 'seawater':
+            units = 'IN/ml'
+            value = df['IN/ml']
+            vol_tube = meta_dict.get('ml/tube', 0.2)
+            lower, upper = wilson_interval(df['FrozenFraction'], num_tubes, sigma)
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                error['IN/ml_lower'] = (numpy.log(num_tubes) - numpy.log(num_tubes - lower*num_tubes)) / vol_tube
+                error['IN/ml_upper'] = (numpy.log(num_tubes) - numpy.log(num_tubes - upper*num_tubes)) / vol_tube
+        else:
+            units = 'IN/L'
+            value = df['IN/L'] if 'IN/L' in df else df['IN/L (INP per liter of air)']
+            error['IN/L_lower'] = df['lower INP/L'] if 'lower INP/L' in df else numpy.nan
+            error['IN/L_upper'] = df['upper INP/L'] if 'upper INP/L' in df else numpy.nan
+        error.insert(1, units, value)
+        error['error_y'] = error[units+'_upper'] - value
+        error['error_minus_y'] = abs(error[units+'_lower'] - value)
+        error.insert(0, 'process', process)
+        error.insert(0, 'datetime', pd.to_datetime(str(meta_dict['sample collection date'])[0:14], format='%d%m%Y %Hh%M'))
+        error['type'] = type_
+        error['location'] = location
+        error['filtered'] = meta_dict.get('process')
+        if type_ == 'aerosol':
+            error['size'] = meta_dict.get('size')
+        frames.append(error)
+    return combine_frames(frames, ignore_index=True)
+
+def _update_clean_store(store, folder, files, type_, location, max_workers = None, errors = False):
+    '''
+    Brings the incremental store of clean_calculated_in up to date with the report files in folder and returns the cleaned rows
+    and, with errors=True, the error bars of all of them.
+    '''
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError('Incremental cleaning requires pyarrow. Install it or set incremental=False.')
+    os.makedirs(store, exist_ok=True)
+    manifest_path = store + 'manifest.csv'
+    if os.path.exists(manifest_path):
+        manifest = pd.read_csv(manifest_path, dtype={'file': str, 'mtime': float, 'sha1': str}).set_index('file')
+    else:
+        manifest = pd.DataFrame(columns=['mtime', 'sha1'], index=pd.Index([], name='file'))
+
+    # find new and changed report files. A file whose modification time changed but whose content did not is not read again.
+    entries = {}
+    changed = []
+    for file in files:
+        mtime = os.path.getmtime(folder + file)
+        if file in manifest.index and manifest.loc[file, 'mtime'] == mtime:
+            entries[file] = (mtime, manifest.loc[file, 'sha1'])
+            continue
+        sha1 = _file_sha1(folder + file)
+        entries[file] = (mtime, sha1)
+        if file not in manifest.index or manifest.loc[file, 'sha1'] != sha1:
+            changed.append(file)
+
+    # error bars are only kept by runs with errors=True, so unchanged report files cleaned without them are read for their error bars
+    missing = [file for file in files if file not in changed and not os.path.exists(store + os.path.splitext(file)[0] + '_errors.parquet')] if errors else []
+
+    # clean the new and changed report files and replace their rows in the store
+    # a Parquet copy of a report file is only used if it was written from the hashed XLSX file
+    reports = read_report([folder + file for file in changed + missing], max_workers=max_workers, sha1=[entries[file][1] for file in changed + missing])
+    for file, (tables, meta_dict) in zip(changed + missing, reports):
+        if file in changed:
+            combine_frames(_clean_report(tables, meta_dict, type_, location)).to_parquet(store + os.path.splitext(file)[0] + '.parquet')
+        if errors:
+            _report_errors(tables, meta_dict, type_, location).to_parquet(store + os.path.splitext(file)[0] + '_errors.parquet')
+        elif os.path.exists(store + os.path.splitext(file)[0] + '_errors.parquet'):
+            # error bars of an earlier version of the report file
+            os.remove(store + os.path.splitext(file)[0] + '_errors.parquet')
+
+    # drop the rows of report files that no longer exist
+    for file in manifest.index.difference(files):
+        for suffix in ['.parquet', '_errors.parquet']:
+            if os.path.exists(store + os.path.splitext(file)[0] + suffix):
+                os.remove(store + os.path.splitext(file)[0] + suffix)
+
+    manifest = pd.DataFrame([(file, mtime, sha1) for file, (mtime, sha1) in entries.items()], columns=['file', 'mtime', 'sha1'])
+    manifest.to_csv(manifest_path, index=False)
+    print(f'...{len(changed)} new or changed of {len(files)} report files cleaned.')
+
+    frames = [pd.read_parquet(store + os.path.splitext(file)[0] + '.parquet') for file in files]
+    error_frames = [pd.read_parquet(store + os.path.splitext(file)[0] + '_errors.parquet') for file in files] if errors else []
+    return frames, error_frames
+
+def clean_calculated_in(type_, location, max_workers = None, incremental = False, errors = False):
     '''
     Creates an XLSX spreadsheet of cleaned data ready for analysis. 
     
+    With errors=True, Wilson score error bars are calculated from the same read of each report file and saved as a second csv,
+    in long form with one row per datetime, process and temperature (see :py:func:`calculate_wilson_errors` for the error bars).
+    Sample information is taken from the report metadata rather than the file names.
+    
+    In incremental mode, the cleaned rows of each report file are kept in a store of Parquet files (one per report) with a manifest
+    of the processed report files (name, modification time and content hash). Only new or changed report files are read; rows of
+    report files that were removed from the folder are dropped. The combined time series is then rebuilt from the store. Requires pyarrow.
+    
     Parameters
     ------------
         type_ : str
             The sample type for which this blank was collected. [seawater, aerosol]
         location : str
             Where sample was collected. [uway, ASIT, wkbtsml, wkbtssw, bubbler, coriolis]
+        max_workers : int
+            Number of worker processes used to read the report files. Defaults to the number of processors on the machine.
+        incremental : bool
+            Only process report files that are new or changed since the last incremental run. [DEFAULT = False]
+        errors : bool
+            Also save the INP concentrations joined with their Wilson error bars. [DEFAULT = False]
     
     Notes
     ------------
     raw input data: \\[PROJECT_ROOT]\\data\\interim\\IN\\calculated\\[SAMPLE_TYPE]\\[SAMPLE_LOCATION]\\[FILE]
     cleaned output file: \\[PROJECT_ROOT]\\data\\interim\\IN\\cleaned\\combinedtimeseries\\[SAMPLE_TYPE]\\[FILE]
+    error bar output file: \\[PROJECT_ROOT]\\data\\interim\\IN\\cleaned\\combinedtimeseries\\[SAMPLE_TYPE]\\[SAMPLE_LOCATION]_[START_DATE]_[END_DATE]_errors.csv
+    incremental store: \\[PROJECT_ROOT]\\data\\interim\\IN\\cleaned\\combinedtimeseries\\[SAMPLE_TYPE]\\[SAMPLE_LOCATION]_store\\
     '''
     
+    folder = '..\\data\\interim\\IN\\calculated\\'+type_+'\\'+location+'\\'
+    files = sorted(file for file in os.listdir(folder) if file.endswith('.xlsx'))
     
-    # create a dataframe that will contain all of the data from each separate calculated file.
-    big_df = pd.DataFrame()
-    
-    # cycle through all calculated report files in the folder
-    for file in os.listdir('..\\data\\interim\\IN\\calculated\\'+type_+'\\'+location+'\\'):
-        
-        # account for unheated and heated processes
-        procs = ['UH','H']
-
-        if type_=='seawater':
-            
-            for process in procs:
-                
-                # load the file
-                df = pd.read_excel('..\\data\\interim\\IN\\calculated\\'+type_+'\\'+location+'\\'+file, sheet_name='summary_UF_'+process)
-                
-                # rename annoying column names
-                df['T (*C)'] =df['T (*C)'].round(1)
-                
-                # create a df for transforming 
-                current = pd.DataFrame()
-                
-                # create transposed df and give it appropriate column names
-                fd = df.T
-                fd.columns = fd.loc['T (*C)',:]
-                
-                # add data to dataframe
-                current= current.append(fd.loc['IN/ml',:], ignore_index=True)
-                current['datetime'] = fd.iloc[-1,4]
-                current['time'] = current['datetime'].iloc[0][9:]
-                
-                # turn columns into strings so they aren't ints
-                current.columns = current.columns.astype(str)
-                
-                # add label data
-                current['process'] = process
-                current['type'] = type_
-                current['location'] = location
-                current['filtered'] = 'uf'
-                
-                # append this to the final dataframe
-                big_df=big_df.append(current)
-        
-        elif type_ == 'aerosol' and location == 'bubbler':
-            
-            for process in procs:
-                
-                # load the file
-                df = pd.read_excel('..\\data\\interim\\IN\\calculated\\'+type_+'\\'+location+'\\'+file, sheet_name='summary_UF_'+process)
-                
-                # rename annoying column names
-                df['T (*C)'] =df['T (*C)'].round(1)
-                
-                # create a df for transforming 
-                current = pd.DataFrame()
-                
-                # create transposed df and give it appropriate column names
-                fd = df.T
-                fd.columns = fd.loc['T (*C)',:]
-                
-                # add data to current
-                current=current.append(fd.loc['IN/L',:], ignore_index=True)
-                current['datetime'] = fd.iloc[-1,4][0:14]
-                current['start_date'] = fd.iloc[-1,4][0:14]
-                current['stop_date'] = fd.iloc[-1,4][21:]
-
-                # turn columns into strings so they aren't ints
-                current.columns = current.columns.astype(str)
-
-                # add label data
-                if 'super' in file:
-                    current['size'] = 'super'
-                if 'sub' in file:
-                    current['size'] = 'sub'
-                current['process'] = process
-                current['type'] = type_
-                current['location'] = location
-                current['filtered'] = 'uf'
-                
-                # append this to the final big_df
-                big_df=big_df.append(current)
+    if incremental:
+        # only new or changed report files are read; the rows of all files come from the store.
+        store = '..\\data\\interim\\IN\\cleaned\\combinedtimeseries\\'+type_+'\\'+location+'_store\\'
+        frames, error_frames = _update_clean_store(store, folder, files, type_, location, max_workers, errors)
+    else:
+        # load the summary tables of both processes of all calculated report files in the folder, in parallel.
+        # parquet copies of the report files are picked up by read_report.
+        reports = read_report([folder + file for file in files], max_workers=max_workers)
         
-        elif type_=='aerosol' and location == 'coriolis':
-            
-            for process in procs:
-                
-                # load the file
-                df = pd.read_excel('..\\data\\interim\\IN\\calculated\\'+type_+'\\'+location+'\\'+file, sheet_name='summary_UF_'+process)
-                # rename annoying column names
-                df['T (*C)'] =df['T (*C)'].round(1)
-                # create a df for transforming 
-                current = pd.DataFrame()
-                # create transposed df and give it appropriate column names
-                fd = df.T
-                fd.columns = fd.loc['T (*C)',:]
-                
-                # add data to current
-                current=current.append(fd.loc['IN/L (INP per liter of air)',:], ignore_index=True)
-                current['date'] = fd.iloc[-1,4]
-                current['hour'] = current['date'].iloc[0][9:]
-                current['start_date'] = current.loc[0,'date'][0:14]
-                current['stop_date'] = current.loc[0,'date'][23:]
-                
-                # add label data
-                if 'super' in file:
-                    current['size'] = 'super'
-                if 'sub' in file:
-                    current['size'] = 'sub'
-
-                # turn columns into strings so they aren't ints
-                current.columns = current.columns.astype(str)
-                current['process'] = process
-                
-                # append this to the final big_df
-                big_df=big_df.append(current)
-
+        # collect the data (and error bars) from each separate calculated file. They are combined into one dataframe at the end.
+        frames = []
+        error_frames = []
+        for tables, meta_dict in reports:
+            frames.extend(_clean_report(tables, meta_dict, type_, location))
+            if errors:
+                error_frames.append(_report_errors(tables, meta_dict, type_, location))
+
+    # combine all files at once. Temperature columns hold concentrations.
+    big_df = combine_frames(frames, dtypes={str(temp): float for temp in LINDA_TEMPS})
+    
     # save output to combined time series folder
     strt=big_df['datetime'].min()[0:8]
     end=big_df['datetime'].max()[0:8]
     out_name = strt+'_'+end
     big_df.to_csv('..\\data\\interim\\IN\\cleaned\\combinedtimeseries\\'+type_+'\\'+location+'_'+out_name+'.csv', index=False)
+    
+    # save the concentrations joined with their error bars, keyed by datetime, process and temperature
+    if errors:
+        error_df = combine_frames(error_frames, ignore_index=True).sort_values(['datetime', 'process', 'temp'], ascending=[True, False, False])
+        error_df.to_csv('..\\data\\interim\\IN\\cleaned\\combinedtimeseries\\'+type_+'\\'+location+'_'+out_name+'_errors.csv', index=False)
     #big_df.date=pd.to_datetime(big_df.datetime, dayfirst=True, format='%d%m%Y %Hh%M')
 
-def clean_inverted(inpath, nbins, outpath):
+PSD_MOMENTS = {
+    # per particle quantity of each size bin, for Dp in nm
+    'number': lambda Dp: numpy.ones_like(Dp),                     # #
+    'surface': lambda Dp: (Dp*1e-9)**2*3.14159*1e12,              # um2 (pi Dp^2)
+    'volume': lambda Dp: (Dp*1e-3)**3*3.14159/6,                  # um3 (pi/6 Dp^3)
+}
+
+class SizeBins(object):
+    '''
+    Diameter bin geometry of a scanotron scan with nb log-spaced bins from Dbeg to Dend (nm).
+
+    Get instances with :py:func:`size_bins`, which keeps one per (Dbeg, Dend, nb) so the arrays are only calculated once. The arrays
+    are read only.
+
+    Attributes
+    ------------
+    dbeg, dend : float
+        Smallest and largest bin center in nm.
+    nb : int
+        Number of bins.
+    dLogDp : float
+        Log of the particle diameter bin size.
+    LogDp : array
+        log10 of each bin center.
+    Dp : array
+        Exact bin centers in nm.
+    labels : list
+        Bin centers rounded to whole nm, as used for the column names of the combined time series files.
+    edges : array
+        nb+1 bin edges in nm, half a bin width (in log space) either side of each center.
+    surface, volume : array
+        Surface (um2) and volume (um3) of a particle at each bin center, see PSD_MOMENTS.
+    '''
+    def __init__(self, dbeg, dend, nb):
+        self.dbeg = float(dbeg)
+        self.dend = float(dend)
+        self.nb = int(nb)
+        self.dLogDp = (math.log10(self.dend)-math.log10(self.dbeg))/(self.nb-1)
+        # centers from their index rather than by accumulating dLogDp, so the last center is exactly dend
+        self.LogDp = numpy.linspace(math.log10(self.dbeg), math.log10(self.dend), self.nb)
+        self.Dp = 10**self.LogDp
+        self.Dp[[0, -1]] = self.dbeg, self.dend
+        self.labels = [int(x) for x in numpy.round(self.Dp)]
+        self.edges = 10**numpy.linspace(self.LogDp[0]-self.dLogDp/2, self.LogDp[-1]+self.dLogDp/2, self.nb+1)
+        for array in (self.LogDp, self.Dp, self.edges):
+            array.flags.writeable = False
+        self._weights = {}
+        self.surface = self.weights('surface')
+        self.volume = self.weights('volume')
+
+    def __repr__(self):
+        return f'SizeBins(dbeg={self.dbeg:g}, dend={self.dend:g}, nb={self.nb})'
+
+    def weights(self, moment):
+        '''
+        Returns the read only per-particle weight vector of a moment (see PSD_MOMENTS) at the bin centers.
+        '''
+        if moment not in self._weights:
+            weight = PSD_MOMENTS[moment](self.Dp)
+            weight.flags.writeable = False
+            self._weights[moment] = weight
+        return self._weights[moment]
+
+# SizeBins instances, keyed by (Dbeg, Dend, nb)
+_SIZE_BINS = {}
+
+def size_bins(dbeg, dend, nb):
+    '''
+    Returns the :py:class:`SizeBins` of nb log-spaced diameter bins from dbeg to dend (nm). Each geometry is calculated once per process.
+
+    Parameters
+    ------------
+    dbeg : float
+        Smallest bin center in nm. [e.g. dbeg column of the inverted scanotron data]
+    dend : float
+        Largest bin center in nm. [e.g. dend column of the inverted scanotron data]
+    nb : int
+        Number of bins.
+
+    Returns
+    ------------
+    bins : SizeBins
+        The bin geometry.
+    '''
+    key = (float(dbeg), float(dend), int(nb))
+    bins = _SIZE_BINS.get(key)
+    if bins is None:
+        bins = SizeBins(*key)
+        _SIZE_BINS[key] = bins
+    return bins
+
+# Number of columns before the size bins in inverted (invstd version 4) Scanotron files, and the ones holding integers.
+INVERTED_COLUMNS = 14
+INVERTED_INT_COLUMNS = ['yr', 'mo', 'dy', 'hr', 'mn', 'sc', 'nb']
+
+def _read_inverted_file(path):
+    '''
+    Reads one inverted Scanotron file and parses its header. Returns the column names and the data lines as text.
+    '''
+    with open(path) as f:
+        header = [f.readline() for _ in range(5)]
+        data = f.read()
+    meta = {}
+    for line in header[:3]:
+        key, _, value = line.lstrip('#').partition(':')
+        meta[key.strip()] = value.strip()
+    if meta.get('format name') != 'invstd' or meta.get('format version') != '4':
+        raise ValueError(f'{path} is not an inverted (invstd version 4) Scanotron file.')
+    # the size bins are not named
+    columns = [name.strip().replace('#', '').lower() for name in header[3].split('\t')][:INVERTED_COLUMNS]
+    if data and not data.endswith('\n'):
+        data += '\n'
+    return columns, data
+
+def read_inverted(inpath, dtype = numpy.float32, max_workers = None):
+    '''
+    Reads and combines inverted Scanotron (DMPS) files in the invstd version 4 format.
+
+    The files are read concurrently on a thread pool and the header of each is parsed once. The data lines of all files are then
+    parsed in a single pass with fixed dtypes (integers for the date, time and number of bins, floats for the rest), and the
+    timestamps are built with vectorized integer arithmetic.
+
+    Parameters
+    ------------
+    inpath : str or list
+        Path to an inverted Scanotron file, or a list of paths. Files are combined in order and must have the same columns.
+    dtype : numpy dtype
+        dtype of the size bin concentrations. [DEFAULT = numpy.float32]
+    max_workers : int
+        Number of threads used to read the files. [DEFAULT = None, chosen by concurrent.futures]
+
+    Returns
+    ------------
+    df : df
+        One row per scan. Columns are yr, mo, dy, hr, mn, sc, pex, tex, rhsh, tgrad, nb, dbeg, dend, conctotal, the size bins
+        (numbered from 0) and time.
+    '''
+    paths = [inpath] if isinstance(inpath, str) else list(inpath)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        files = list(executor.map(_read_inverted_file, paths))
+    columns = files[0][0]
+    for path, (file_columns, _) in zip(paths, files):
+        if file_columns != columns:
+            raise ValueError(f'The columns of {path} do not match those of {paths[0]}.')
+    data = ''.join(text for _, text in files)
+
+    # count the size bins on the first scan so every column can be given its dtype up front
+    nbins = len(data[:data.find('\n')].split('\t')) - INVERTED_COLUMNS
+    names = columns + list(range(nbins))
+    dtypes = {name: (numpy.int64 if name in INVERTED_INT_COLUMNS else numpy.float64) for name in columns}
+    dtypes.update({i: dtype for i in range(nbins)})
+    df = pd.read_csv(io.StringIO(data), sep='\t', header=None, names=names, dtype=dtypes, engine='c')
+
+    # build the timestamps with integer arithmetic: months since 1970, then seconds into the month
+    months = (df['yr'].to_numpy() - 1970)*12 + df['mo'].to_numpy() - 1
+    seconds = (df['dy'].to_numpy() - 1)*86400 + df['hr'].to_numpy()*3600 + df['mn'].to_numpy()*60 + df['sc'].to_numpy()
+    df['time'] = (months.astype('datetime64[M]').astype('datetime64[s]') + seconds.astype('timedelta64[s]')).astype('datetime64[ns]')
+    return df
+
+def clean_inverted(inpath, nbins, outpath, max_workers = None, psd_store = False):
     '''
     Accepts inverted scanotron data files from a specified given folder. Appends them into one dataframe and 
     sends them out to /interim/scanotron/combinedtimeseries/ folder. Also returns the completed dataframe as a variable for immediate use, as well as the file name and dLogDp value.
@@ -889,6 +2360,10 @@ def clean_inverted(inpath, nbins, outpath):
         Number of diameter bins for scanotron.
     outpath : str
         Desired location for the combined time series csv file. [example: '..\\data\\interim\\'+instr+'\\combinedtimeseries\\BHS\\']
+    max_workers : int
+        Number of threads used to read the files. [DEFAULT = None, chosen by concurrent.futures]
+    psd_store : bool
+        Also save dNdLogDp as a memory mappable binary store (see :py:func:`save_psd_store`) in the folder [outName]_psd. [DEFAULT = False]
 
     Returns
     ------------
@@ -905,40 +2380,19 @@ def clean_inverted(inpath, nbins, outpath):
     calculated output file: ..\\data\\interim\\'+instr+'\\combinedtimeseries\\BHS\\[FILE]
     '''
     
-    dfBig=pd.DataFrame()
     path=inpath
 
     # Read all the files in the folder defined by inpath variable.
-    for file in os.listdir(path):
-        if file.endswith('.csv'):
-            df = pd.read_csv(path+file, skiprows=5,header=None,sep='\t')
-            dfBig = dfBig.append(df)
-            # Read in column names
-            columns = pd.read_csv(path+file, skiprows=3,nrows=0,sep='\t').columns.tolist()
-            # Remove all bad chars from column names
-            for name in range(len(columns)):
-                columns[name]=(columns[name]).strip()
-                columns[name]=(columns[name]).replace("#","")
-                columns[name]=columns[name].lower()
-    # Count number of missing column names (these are due to the size bins of the data)
-    num_missing_cols=nbins
-    # Calculate and add in new column names based on the size of the bins
-    start_bin = df.iloc[1,11]   # Smallest Dp
-    end_bin = df.iloc[1,12]     # Largest Dp
-    dLogDp=(math.log10(end_bin)-math.log10(start_bin))/(num_missing_cols-1)
-    num = math.log10(start_bin)
-    LogDp = [math.log10(start_bin)]
-    while num < math.log10(end_bin):
-        num = num + dLogDp
-        LogDp.append(num)
-    Dp = [10**j for j in LogDp]
-    Dp=[round(x) for x in Dp]
-    columns.remove('conc...')
-    dfBig.columns = columns + Dp
+    files = [os.path.join(path, file) for file in os.listdir(path) if file.endswith('.csv')]
+    dfBig = read_inverted(files, max_workers=max_workers)
+    # Name the size bin columns by their (rounded) diameters
+    bins = size_bins(dfBig['dbeg'].iloc[0], dfBig['dend'].iloc[0], nbins)
+    dLogDp = bins.dLogDp
+    Dp = bins.labels
+    dfBig = dfBig.rename(columns=dict(zip(range(nbins), Dp)))
     # Create datetimes
     dfBig=dfBig.rename(columns={'yr':'year','mo':'month','dy':'day','hr':'hour','mn':'minute','sc':'second'})
-    dfBig['time']=pd.to_datetime(dfBig[['year', 'month', 'day', 'hour','minute','second']])
-    dfBig['timeString'] = dfBig['time'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    dfBig['timeString'] = [stamp.replace('T', ' ') for stamp in numpy.datetime_as_string(dfBig['time'].to_numpy(), unit='s')]
     # Set df index as datetime for easy parsing
     dfBig=dfBig.set_index(['timeString'])
     # Save as csv
@@ -946,20 +2400,37 @@ def clean_inverted(inpath, nbins, outpath):
     strt=dfBig.index[0]
     end=dfBig.index[-1]
     outName = strt[0:10]+'_'+end[0:10]
-    dfBig.to_csv(outpath+outName+'.csv')
+    dfBig.to_csv(os.path.join(outpath, outName+'.csv'))
+    if psd_store:
+        save_psd_store(dfBig['time'].to_numpy(), Dp, dfBig[Dp].to_numpy(), dLogDp, os.path.join(outpath, outName+'_psd'))
     return dfBig, outName, dLogDp
 
-def clean_magic(inpath, outpath, timezone):
+def _read_magic_file(path):
+    '''
+    Reads one raw magic CPC file. Returns the cleaned column names and the data lines as text.
+    '''
+    with open(path) as f:
+        header = [f.readline() for _ in range(4)]
+        data = f.read()
+    # Remove all bad chars from column names
+    columns = [name.strip().replace('#', '').replace(' ', '').lower().replace('utc', 'time') for name in header[3].rstrip('\r\n').split('\t')]
+    if 'time' not in columns:
+        raise ValueError(f'{path} is not a magic CPC file (no UTC column).')
+    if data and not data.endswith('\n'):
+        data += '\n'
+    return columns, data
+
+def clean_magic(inpath, outpath, timezone, max_workers = None, columnar = False):
     '''
     Loads all raw magic CPC data files, cleans it up, and appends it into one file.
-    Returns the cleaned dataset to chosen outpath as csv file. 
+    Returns the cleaned dataset to chosen outpath as csv (or Parquet) file. 
     
     The steps of the cleaning process are as follows:
-        1) open all data files in the data/raw folder path
-        2) append all data files into one df
+        1) read all data files in the data/raw folder path (concurrently, on a thread pool)
+        2) parse the data of all files in one pass, with the column names of the first file
         3) remove bad chars in column names
-        4) create a timeString column in UTC time
-        5) save df to csv in specified folder
+        4) create a DatetimeIndex named time, shifted by one hour and labelled with timezone
+        5) save df to csv or Parquet in specified folder
     
     Parameters
     ------------
@@ -967,56 +2438,255 @@ def clean_magic(inpath, outpath, timezone):
          location where raw csv file is found.
     outpath : str
         location where cleaned csv file is saved.
+    timezone : str
+        Timezone the times are labelled with. [example: 'Etc/GMT+1']
+    max_workers : int
+        Number of threads used to read the files. [DEFAULT = None, chosen by concurrent.futures]
+    columnar : bool
+        Save a columnar Parquet file instead of a csv file. Requires pyarrow. [DEFAULT = False]
     
     Returns
     ------------
     dfBig : df
-        the df that was just saved to a folder
+        the df that was just saved to a folder, with a DatetimeIndex named time
     outName : str
         string of the start and end datetimes
     
     '''
-    dfBig=pd.DataFrame()
+    if columnar:
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError('Columnar magic CPC output requires pyarrow. Install it or set columnar=False.')
     path= inpath
 
     #Read in all the files in a given folder.
-    for file in os.listdir(path):
-        if file.endswith('.csv'):
-            df = pd.read_csv(path+file, sep='\t', parse_dates=['# UTC               '], skiprows=3)
-            dfBig = dfBig.append(df)
-            # Read in column names
-            columns = pd.read_csv(path+file,skiprows=3,nrows=0,sep='\t').columns.tolist()
-            # Remove all bad chars from column names
-            for name in range(len(columns)):
-                columns[name]=(columns[name]).strip()
-                columns[name]=(columns[name]).replace("#","")
-                columns[name]=(columns[name]).replace(" ","")
-                columns[name]=columns[name].lower()
-                columns[name]=(columns[name]).replace("utc","time")
-    dfBig.columns = columns
-    dfBig.time=dfBig.time+DateOffset(hours=1)
-    dfBig.set_index('time',inplace=True)
-    dfBig=dfBig.tz_localize(None)
-    dfBig=dfBig.tz_localize(timezone)
-    dfBig.reset_index(inplace=True)
-    dfBig['timeString'] = dfBig['time'].dt.strftime('%Y-%m-%d (%H:%M:%S)')
-    dfBig=dfBig.set_index(['timeString'])
-    strt=dfBig.index[0]
-    end=dfBig.index[-1]
-    outName = strt[0:10]+'_'+end[0:10]
-    dfBig.to_csv(outpath+outName+'.csv')
+    paths = [path+file for file in sorted(os.listdir(path)) if file.endswith('.csv')]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        files = list(executor.map(_read_magic_file, paths))
+    columns = files[0][0]
+    for file, (file_columns, _) in zip(paths, files):
+        if file_columns != columns:
+            raise ValueError(f'The columns of {file} do not match those of {paths[0]}.')
+    # the times are parsed once for all files, every other column is numeric
+    dfBig = pd.read_csv(io.StringIO(''.join(text for _, text in files)), sep='\t', header=None, names=columns, dtype={'time': str}, engine='c')
+    time = pd.DatetimeIndex(pd.to_datetime(dfBig.pop('time').str.strip()))
+    if time.tz is not None:
+        time = time.tz_localize(None)
+    dfBig.index = (time + pd.Timedelta(hours=1)).tz_localize(timezone).rename('time')
+    dfBig = dfBig.sort_index(kind='stable')
+    outName = dfBig.index[0].strftime('%Y-%m-%d')+'_'+dfBig.index[-1].strftime('%Y-%m-%d')
+    if columnar:
+        dfBig.to_parquet(outpath+outName+'.parquet')
+    else:
+        # format the times once (as pandas would, e.g. 2020-03-17 01:00:00-01:00) instead of row by row
+        local = dfBig.index.tz_localize(None).to_numpy()
+        offsets = (local - dfBig.index.tz_convert('UTC').tz_localize(None).to_numpy()).astype('timedelta64[m]').astype(int)
+        offsets, which = numpy.unique(offsets, return_inverse=True)
+        suffixes = numpy.array([('+' if o >= 0 else '-')+f'{abs(o)//60:02d}:{abs(o)%60:02d}' for o in offsets])
+        stamps = numpy.char.add(numpy.char.replace(numpy.datetime_as_string(local, unit='s'), 'T', ' '), suffixes[which])
+        dfBig.set_axis(pd.Index(stamps, name='time')).to_csv(outpath+outName+'.csv')
     return dfBig, outName
 
-def load_scano_data(date_string, instrument):
+def save_psd_store(time, Dp, dNdLogDp, dLogDp, path):
+    '''
+    Saves a particle size distribution time series as a binary store that can be memory mapped with :py:func:`load_psd_store`.
+
+    The store is a folder holding dNdLogDp.npy (float32 matrix, one row per scan and one column per diameter), time.npy (datetime64[ns],
+    sorted), Dp.npy (diameters in nm) and meta.json (dLogDp).
+
+    Parameters
+    ------------
+    time : array
+        Time of each scan.
+    Dp : array
+        Diameter of each size bin in nm.
+    dNdLogDp : array
+        Log-normalized particle counts, shape (scans, size bins).
+    dLogDp : float
+        Log of the particle diameter bin size.
+    path : str
+        Folder of the store. [example: '..\\data\\interim\\scanotron\\combinedtimeseries\\2020-03-16_2020-03-18_psd']
+    '''
+    time = numpy.asarray(time, dtype='datetime64[ns]')
+    order = numpy.argsort(time, kind='stable')
+    os.makedirs(path, exist_ok=True)
+    numpy.save(os.path.join(path, 'dNdLogDp.npy'), numpy.ascontiguousarray(numpy.asarray(dNdLogDp, dtype=numpy.float32)[order]))
+    numpy.save(os.path.join(path, 'time.npy'), time[order])
+    numpy.save(os.path.join(path, 'Dp.npy'), numpy.asarray(Dp))
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump({'dLogDp': float(dLogDp)}, f)
+
+def load_psd_store(path, start = None, end = None):
+    '''
+    Opens a particle size distribution store saved with :py:func:`save_psd_store` without reading it into memory.
+
+    The matrix is memory mapped (read only) and the time range is found by binary search on the sorted times, so only the rows
+    that are used are ever read from disk.
+
+    Parameters
+    ------------
+    path : str
+        Folder of the store.
+    start : str or datetime
+        First time to include. [DEFAULT = None, from the first scan]
+    end : str or datetime
+        Last time to include. [DEFAULT = None, up to the last scan]
+
+    Returns
+    ------------
+    time : array
+        datetime64[ns] time of each scan in the range.
+    Dp : array
+        Diameter of each size bin in nm.
+    dNdLogDp : numpy.memmap
+        Read only view of the log-normalized particle counts in the range, shape (scans, size bins).
+    dLogDp : float
+        Log of the particle diameter bin size.
+    '''
+    dNdLogDp = numpy.load(os.path.join(path, 'dNdLogDp.npy'), mmap_mode='r')
+    time = numpy.load(os.path.join(path, 'time.npy'), mmap_mode='r')
+    Dp = numpy.load(os.path.join(path, 'Dp.npy'))
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    lo = 0 if start is None else numpy.searchsorted(time, numpy.datetime64(pd.Timestamp(start), 'ns'), side='left')
+    hi = len(time) if end is None else numpy.searchsorted(time, numpy.datetime64(pd.Timestamp(end), 'ns'), side='right')
+    return numpy.asarray(time[lo:hi]), Dp, dNdLogDp[lo:hi], meta['dLogDp']
+
+def _scano_rows(folder, name):
+    '''
+    Returns the time and the byte offset of each scan (row) of a combined time series csv file. The offsets have one more entry,
+    the end of the file.
+
+    They are kept in [name]_rows.npz next to the csv file and only calculated again when the csv file changed.
+    '''
+    path = os.path.join(folder, name + '.csv')
+    rows_path = os.path.join(folder, name + '_rows.npz')
+    mtime = os.path.getmtime(path)
+    if os.path.exists(rows_path):
+        with numpy.load(rows_path) as rows:
+            if rows['mtime'] == mtime:
+                return rows['time'], rows['offset']
+
+    with open(path, 'rb') as f:
+        content = f.read()
+    # every row but the header starts after a newline
+    offset = numpy.flatnonzero(numpy.frombuffer(content, dtype=numpy.uint8) == ord('\n')) + 1
+    if len(offset) == 0 or offset[-1] != len(content):
+        offset = numpy.r_[offset, len(content)]
+    time = pd.read_csv(io.BytesIO(content), usecols=['time'], parse_dates=['time'])['time'].to_numpy(dtype='datetime64[ns]')
+    if len(offset) != len(time) + 1:
+        raise ValueError(f'Could not find the rows of {path}. Combined time series files have one scan per line.')
+    numpy.savez(rows_path, time=time, offset=offset, mtime=mtime)
+    return time, offset
+
+def _scano_times(folder, name):
+    '''
+    Returns the time of each scan of a combined time series file, from its binary store if there is one.
+    '''
+    store = os.path.join(folder, name + '_psd')
+    if os.path.exists(os.path.join(store, 'time.npy')):
+        return numpy.load(os.path.join(store, 'time.npy'), mmap_mode='r')
+    return _scano_rows(folder, name)[0]
+
+def index_scano_data(instrument):
+    '''
+    Updates and returns the index of the combined time series files of an instrument, i.e. which file covers which time span.
+
+    The index is kept in index.csv in the combinedtimeseries folder. Only files that are new or changed since the last update are read,
+    and only their time column (or the time vector of their binary store). The time and byte offset of every row of a csv file are
+    kept next to it in [name]_rows.npz, so :py:func:`load_scano_data` can read just the rows of a time range.
+
+    Parameters
+    ------------
+    instrument : str
+        Instrument whose files are indexed. [scanotron]
+
+    Returns
+    ------------
+    index : df
+        One row per combined time series file with its name (as used by load_scano_data), first and last scan time, number of scans
+        and modification time.
+    '''
+    folder = os.path.join('..', 'data', 'interim', instrument, 'combinedtimeseries')
+    index_path = os.path.join(folder, 'index.csv')
+    if os.path.exists(index_path):
+        previous = pd.read_csv(index_path, parse_dates=['start', 'end']).set_index('file')
+    else:
+        previous = pd.DataFrame(columns=['start', 'end', 'rows', 'mtime'], index=pd.Index([], name='file'))
+
+    entries = []
+    for file in sorted(os.listdir(folder)):
+        if not file.endswith('.csv') or file == 'index.csv':
+            continue
+        name = file[:-4]
+        mtime = os.path.getmtime(os.path.join(folder, file))
+        if name in previous.index and previous.loc[name, 'mtime'] == mtime:
+            entries.append([name] + previous.loc[name, ['start', 'end', 'rows', 'mtime']].tolist())
+            continue
+        times = _scano_times(folder, name)
+        if len(times) == 0:
+            continue
+        entries.append([name, pd.Timestamp(times.min()), pd.Timestamp(times.max()), len(times), mtime])
+
+    index = pd.DataFrame(entries, columns=['file', 'start', 'end', 'rows', 'mtime'])
+    index.to_csv(index_path, index=False)
+    return index
+
+def _load_scano_file(folder, date_string, start = None, end = None):
+    '''
+    Loads dNdLogDp of one combined time series file between start and end, and its dLogDp. See :py:func:`load_scano_data`.
+    '''
+    # Use the memory mapped binary store if there is one
+    store = os.path.join(folder, date_string+'_psd')
+    if os.path.exists(os.path.join(store, 'dNdLogDp.npy')):
+        time, Dp, values, dLogDp = load_psd_store(store, start, end)
+        dNdLogDp_full = pd.DataFrame(values, index=pd.DatetimeIndex(time, name='time'), columns=[str(d) for d in Dp], copy=False)
+        return dNdLogDp_full, dLogDp
+
+    # Otherwise find the rows in the time range by binary search on the indexed row times, and only read those bytes of the csv file
+    path = os.path.join(folder, date_string+'.csv')
+    content = None
+    if start is not None or end is not None:
+        times, offset = _scano_rows(folder, date_string)
+        if len(times) > 0 and (times[1:] >= times[:-1]).all():
+            lo = 0 if start is None else numpy.searchsorted(times, numpy.datetime64(pd.Timestamp(start), 'ns'), side='left')
+            hi = len(times) if end is None else numpy.searchsorted(times, numpy.datetime64(pd.Timestamp(end), 'ns'), side='right')
+            # at least one row is read for the size bins
+            lo = min(lo, len(times) - 1)
+            hi = max(hi, lo + 1)
+            with open(path, 'rb') as f:
+                header = f.read(offset[0])
+                f.seek(offset[lo])
+                content = io.BytesIO(header + f.read(offset[hi] - offset[lo]))
+
+    # Read in the cleaned and combinedtimeseries scanotron data
+    df=pd.read_csv(path if content is None else content, parse_dates=['time'])
+    # Create a dNdlogDp dataframe
+    bins = size_bins(df.dbeg.iloc[0], df.dend.iloc[0], df.nb.iloc[0])
+    dNdLogDp_full  = df.set_index('time').loc[None if start is None else pd.Timestamp(start):None if end is None else pd.Timestamp(end),[str(d) for d in bins.labels]]
+    return dNdLogDp_full, bins.dLogDp
+
+def load_scano_data(date_string = None, instrument = 'scanotron', start = None, end = None):
     '''
     Loads interim scanotron data that has already been pre-processed using the clean_inverted function. Returns two dataframes of dN and dNdLogDp where rows are time and columns are diameters.
 
+    Data can be requested by file (date_string) or by time range only. Without a date_string, the index of the combined time series
+    files (see :py:func:`index_scano_data`) is used to find the files that cover start to end, and only the rows in that range are read.
+
+    If the data were also saved as a binary store (clean_inverted with psd_store=True), the store is memory mapped instead of parsing
+    the csv file. dNdLogDp of a single store is then a read only, zero-copy view of the requested rows.
+
     Parameters
     ------------
     date_string : str
-        Dates of scanotron data that are requested. [YYYY-MM-DD_YYYY_MM_DD]
+        Dates of scanotron data that are requested. [YYYY-MM-DD_YYYY_MM_DD] [DEFAULT = None, all files covering start to end]
     instrument : str
         Instrument that is being loaded. [scanotron]
+    start : str or datetime
+        Only return data from this time onwards. [DEFAULT = None]
+    end : str or datetime
+        Only return data up to this time. [DEFAULT = None]
 
     Returns
     ------------
@@ -1028,65 +2698,343 @@ def load_scano_data(date_string, instrument):
     Notes
     ------------
     raw input data: \\[PROJECT_ROOT]\\data\\interim\\scanotron\\combinedtimeseries\\[FILE]
+    binary store: \\[PROJECT_ROOT]\\data\\interim\\scanotron\\combinedtimeseries\\[FILE]_psd\\
+
+    Examples
+    ---------
+    >>> dN, dNdLogDp = pt.load_scano_data(start='2020-03-17 06:00', end='2020-03-17 12:00', instrument='scanotron')
     '''
-    # Read in the cleaned and combinedtimeseries scanotron data
-    df=pd.read_csv(
-        '..\\data\\interim\\'+instrument+'\\combinedtimeseries\\'+date_string+'.csv',
-        parse_dates=['time'])
-    # Create a dNdlogDp dataframe
-    dNdLogDp_full  = df.set_index('time').loc[:,'10':]
-    dLogDp=(math.log10(df.dend[1])-math.log10(df.dbeg[1]))/(df.nb[1]-1)
+    folder = os.path.join('..', 'data', 'interim', instrument, 'combinedtimeseries')
+    if date_string is not None:
+        dNdLogDp_full, dLogDp = _load_scano_file(folder, date_string, start, end)
+    else:
+        # find the files covering the time range
+        index = index_scano_data(instrument)
+        if start is not None:
+            index = index[index['end'] >= pd.Timestamp(start)]
+        if end is not None:
+            index = index[index['start'] <= pd.Timestamp(end)]
+        if len(index) == 0:
+            raise ValueError(f'No {instrument} data between {start} and {end}.')
+        parts = [_load_scano_file(folder, name, start, end) for name in index['file']]
+        dLogDp = parts[0][1]
+        if len(parts) == 1:
+            dNdLogDp_full = parts[0][0]
+        else:
+            # files may overlap, keep each scan once
+            dNdLogDp_full = combine_frames([part for part, _ in parts]).sort_index()
+            dNdLogDp_full = dNdLogDp_full[~dNdLogDp_full.index.duplicated()]
     # Create a dN dataframe
-    dN=df.set_index('time').loc[:,'10':]*dLogDp
+    dN=dNdLogDp_full*dLogDp
     return dN, dNdLogDp_full
 
-def surface_area(smps_daily_mean_df, smps_daily_std_df, nbins):
+def psd_surface_area(Dp, dNdLogDp, dLogDp, axis = -1):
+    '''
+    Calculates particle surface area from log-normalized particle counts, for any number of size distributions at once.
+
+    Works on plain or memory mapped arrays (see :py:func:`load_psd_store`) without changing them; only the outputs are allocated.
+
+    Parameters
+    ------------
+    Dp : array
+        Diameter of each size bin in nm.
+    dNdLogDp : array
+        Log-normalized particle counts (#/cm3). Any shape, with the size bins along axis.
+    dLogDp : float
+        Log of the particle diameter bin size.
+    axis : int
+        Axis of dNdLogDp holding the size bins. [DEFAULT = -1, e.g. one row per scan as in a binary store]
+
+    Returns
+    ------------
+    dA : array
+        Surface area per size bin (um2/cm3).
+    dAdLogDp : array
+        Log-normalized surface area distribution (nm2/cm3).
+    dA_total : array
+        Total surface area of each size distribution (um2/cm3).
+    dN_total : array
+        Total particle count of each size distribution (#/cm3).
+    '''
+    shape = [1]*numpy.ndim(dNdLogDp)
+    shape[axis] = -1
+    # surface area of a particle of each size (pi Dp^2), in um^2 for Dp in nm
+    factor = PSD_MOMENTS['surface'](numpy.asarray(Dp, dtype=float)).reshape(shape)
+
+    dA = dNdLogDp*(factor*dLogDp)
+    dAdLogDp = dNdLogDp*(factor*1e6)
+    dA_total = dA.sum(axis=axis)
+    dN_total = numpy.sum(dNdLogDp, axis=axis, dtype=float)*dLogDp
+    return dA, dAdLogDp, dA_total, dN_total
+
+def psd_moments(dNdLogDp, Dp = None, dLogDp = None, moments = ('number', 'surface', 'volume'), windows = None, density = None):
+    '''
+    Integrates number, surface, volume and mass (and effective diameter) over size windows, for every scan at once.
+
+    One weight vector per moment and window (moment per particle x dLogDp, zero outside the window) is built first, and all totals
+    are then calculated with a single matrix product over the scans. Works on dataframes from :py:func:`load_scano_data` and on
+    plain or memory mapped arrays (see :py:func:`load_psd_store`).
+
+    Parameters
+    ------------
+    dNdLogDp : df or array
+        Log-normalized particle counts (#/cm3), one row per scan and one column per size bin.
+    Dp : array or SizeBins
+        Diameter of each size bin in nm, or the :py:class:`SizeBins` of the data to use the exact bin centers (see :py:func:`size_bins`).
+        [DEFAULT = None, taken from the dataframe columns]
+    dLogDp : float
+        Log of the particle diameter bin size. [DEFAULT = None, from the bins or the first and last diameter]
+    moments : list
+        Totals to calculate, out of number (#/cm3), surface (um2/cm3), volume (um3/cm3), mass (ug/m3, needs density) and
+        effective_diameter (nm, ratio of the third and second moments). [DEFAULT = ('number', 'surface', 'volume')]
+    windows : dict
+        Size windows to integrate over, as name: (smallest Dp, largest Dp) in nm, both inclusive. [DEFAULT = None, all bins as total]
+    density : float
+        Particle density in g/cm3, used for mass. [DEFAULT = None]
+
+    Returns
+    ------------
+    totals : df
+        One row per scan (same index as dNdLogDp) and one column per moment and window, named [moment]_[window].
+
+    Examples
+    ---------
+    >>> dN, dNdLogDp = pt.load_scano_data(start='2020-03-17', end='2020-03-18', instrument='scanotron')
+    >>> totals = pt.psd_moments(dNdLogDp, windows={'10-500': (10, 500), 'total': (0, numpy.inf)})
+    '''
+    index = dNdLogDp.index if isinstance(dNdLogDp, pd.DataFrame) else None
+    if isinstance(Dp, SizeBins):
+        # exact bin centers and cached weights; windows are matched on the rounded diameters
+        bins = Dp
+        Dp = numpy.asarray(bins.labels, dtype=float)
+        dLogDp = bins.dLogDp
+    else:
+        if Dp is None:
+            if index is None:
+                raise ValueError('Dp must be given when dNdLogDp is not a dataframe.')
+            Dp = dNdLogDp.columns
+        Dp = numpy.asarray(Dp, dtype=float)
+        bins = None
+        if dLogDp is None:
+            dLogDp = size_bins(Dp[0], Dp[-1], len(Dp)).dLogDp
+    if windows is None:
+        windows = {'total': (0, numpy.inf)}
+    if 'mass' in moments and density is None:
+        raise ValueError('density is needed to calculate mass.')
+    for moment in moments:
+        if moment not in PSD_MOMENTS and moment not in ('mass', 'effective_diameter'):
+            raise ValueError(f'Unknown moment {moment}. Choose from {list(PSD_MOMENTS)+["mass", "effective_diameter"]}.')
+
+    # the integrals needed: mass is scaled volume and effective diameter is a ratio of volume and surface
+    needed = []
+    for moment in moments:
+        for base in {'mass': ['volume'], 'effective_diameter': ['surface', 'volume']}.get(moment, [moment]):
+            if base not in needed:
+                needed.append(base)
+
+    # one weight column per integral and window
+    names = []
+    weights = []
+    for window, (lo, hi) in windows.items():
+        inside = (Dp >= lo) & (Dp <= hi)
+        for base in needed:
+            names.append((base, window))
+            weight = PSD_MOMENTS[base](Dp) if bins is None else bins.weights(base)
+            weights.append(numpy.where(inside, weight*dLogDp, 0))
+    weights = numpy.stack(weights, axis=1)
+
+    integrals = dict(zip(names, (numpy.asarray(dNdLogDp) @ weights).T))
+
+    totals = {}
+    for window in windows:
+        for moment in moments:
+            if moment == 'mass':
+                # g/cm3 x um3/cm3 = ug/m3
+                totals[f'{moment}_{window}'] = integrals[('volume', window)]*density
+            elif moment == 'effective_diameter':
+                # Deff = sum Dp^3 n / sum Dp^2 n = 6 V / S, in nm
+                with numpy.errstate(divide='ignore', invalid='ignore'):
+                    totals[f'{moment}_{window}'] = 6*integrals[('volume', window)]/integrals[('surface', window)]*1e3
+            else:
+                totals[f'{moment}_{window}'] = integrals[(moment, window)]
+    return pd.DataFrame(totals, index=index)
+
+def time_windows(start, end, freq = '1D'):
+    '''
+    Returns fixed length windows covering start to end, for :py:func:`aggregate_windows`.
+
+    Parameters
+    ------------
+    start : str or datetime
+        First time to cover. The first window starts at start rounded down to freq.
+    end : str or datetime
+        Last time to cover.
+    freq : str
+        Length of the windows as a pandas frequency. [DEFAULT = '1D', i.e. days]
+
+    Returns
+    ------------
+    windows : df
+        Columns start and end (end is the start of the next window), indexed by start.
+    '''
+    starts = pd.date_range(pd.Timestamp(start).floor(freq), pd.Timestamp(end), freq=freq)
+    return pd.DataFrame({'start': starts, 'end': starts + pd.tseries.frequencies.to_offset(freq)}, index=pd.Index(starts, name='window'))
+
+def _parse_collection_dates(dates):
+    '''
+    Parses INP start_date or stop_date values [DDMMYYYY HHhMM] to an array of datetimes.
+    '''
+    return pd.to_datetime(pd.Series(dates).astype(str).str.strip(), format='%d%m%Y %Hh%M').to_numpy()
+
+def inp_windows(inp_data):
+    '''
+    Returns the collection period of each INP sample, for :py:func:`aggregate_windows`.
+
+    Parameters
+    ------------
+    inp_data : df
+        Cleaned INP data (see :py:func:`clean_calculated_in`) with start_date and stop_date columns as [DDMMYYYY HHhMM]. Samples
+        appearing in several rows (processes, sizes) give one window.
+
+    Returns
+    ------------
+    windows : df
+        Columns start and end of each sample, indexed by start_date as in inp_data.
     '''
+    periods = inp_data[['start_date', 'stop_date']].drop_duplicates()
+    return pd.DataFrame({'start': _parse_collection_dates(periods['start_date']), 'end': _parse_collection_dates(periods['stop_date'])},
+        index=pd.Index(periods['start_date'].to_numpy(), name='window'))
+
+def aggregate_windows(data, windows = '1D', by_size = False):
     '''
-     # Calculate log of particle diameter bin size (dLogDp)
-    start_bin = smps_daily_mean_df.index[0]   # Smallest Dp
-    end_bin = smps_daily_mean_df.index[-1]   # Largest Dp
-    dLogDp=(math.log10(end_bin)-math.log10(start_bin))/(nbins-1)
+    Calculates the mean, standard deviation and number of observations of time series data (scanotron scans, magic CPC records, ...)
+    in time windows.
 
-    # Convert particle diameters to meters from nm
-    smps_daily_mean_df.reset_index(inplace=True)
-    smps_daily_mean_df['Dp (m)']=smps_daily_mean_df['Dp']*1e-9
+    The data are sorted by time once and the window bounds are found by binary search. The data between consecutive bounds are summed
+    in one pass, and the sums of each window are then differences of running sums at its bounds, so overlapping windows cost nothing
+    extra.
 
-    smps_daily_std_df.reset_index(inplace=True)
-    smps_daily_std_df['Dp (m)'] = smps_daily_std_df['Dp']*1e-9
+    Parameters
+    ------------
+    data : df
+        Time series with a DatetimeIndex or a time column, e.g. dNdLogDp from :py:func:`load_scano_data` or the output of
+        :py:func:`clean_magic`. Only numeric columns are aggregated and missing values are skipped.
+    windows : str or df
+        A pandas frequency (e.g. '1H' or '1D') for fixed windows (see :py:func:`time_windows`), or a dataframe of windows with start and
+        end columns such as the INP collection periods from :py:func:`inp_windows`. Fixed windows include their start and exclude their
+        end; given windows include both. Times without a timezone are taken to be in the timezone of the data. [DEFAULT = '1D']
+    by_size : bool
+        Return size distributions as rows of diameters (index Dp) and columns of windows, as expected by :py:func:`surface_area` and
+        :py:func:`plot_number_dist`. [DEFAULT = False, rows of windows]
 
-    # Create particle diameter squared (Dp2) in units of meters^2
-    smps_daily_mean_df['Dp2 (m2)'] = smps_daily_mean_df['Dp (m)']**2
-    smps_daily_std_df['Dp2 (m2)'] = smps_daily_std_df['Dp (m)']**2
+    Returns
+    ------------
+    mean : df
+        Mean of each column in each window.
+    std : df
+        Standard deviation (ddof=1) of each column in each window.
+    count : df
+        Number of observations of each column in each window.
 
-    # Calculate factor A for particle surface area calculation in m^2, which is just diameter squared times Pi
-    smps_daily_mean_df['factorA'] = smps_daily_mean_df['Dp2 (m2)']*3.14159
-    smps_daily_mean_df.set_index('Dp',inplace=True)
+    Examples
+    ---------
+    >>> dN, dNdLogDp = pt.load_scano_data('2020-03-16_2020-03-18', 'scanotron')
+    >>> mean, std, count = pt.aggregate_windows(dNdLogDp, pt.inp_windows(inp_bubbler), by_size=True)
+    >>> dAdLogDp, dA_total, dN_total, dAdLogDp_std = pt.surface_area(mean, std, 26)
+    '''
+    if isinstance(data.index, pd.DatetimeIndex):
+        time = data.index
+    else:
+        time = pd.DatetimeIndex(data['time'])
+    values = data.select_dtypes('number').drop(columns='time', errors='ignore')
+    x = values.to_numpy(dtype=float)
+    if not time.is_monotonic_increasing:
+        order = numpy.argsort(time.to_numpy(), kind='stable')
+        time = time[order]
+        x = x[order]
+
+    closed_end = 'right'
+    if isinstance(windows, str):
+        windows = time_windows(time[0], time[-1], windows)
+        closed_end = 'left'
+    starts = pd.DatetimeIndex(windows['start'])
+    ends = pd.DatetimeIndex(windows['end'])
+    if time.tz is not None and starts.tz is None:
+        starts = starts.tz_localize(time.tz)
+        ends = ends.tz_localize(time.tz)
+    lo = time.searchsorted(starts, side='left')
+    hi = time.searchsorted(ends, side=closed_end)
+
+    # sums of the observations and their squares between consecutive window bounds, then running sums at the bounds
+    valid = ~numpy.isnan(x)
+    if not valid.all():
+        x = numpy.where(valid, x, 0)
+    bounds = numpy.unique(numpy.concatenate([lo, hi]))
+    sums = numpy.zeros((3, len(bounds), x.shape[1]))
+    if len(bounds) > 1:
+        segments = x[:bounds[-1]]
+        sums[0, 1:] = numpy.add.reduceat(valid[:bounds[-1]], bounds[:-1], axis=0)
+        sums[1, 1:] = numpy.add.reduceat(segments, bounds[:-1], axis=0)
+        sums[2, 1:] = numpy.add.reduceat(segments**2, bounds[:-1], axis=0)
+        sums = numpy.cumsum(sums, axis=1)
+    lo = numpy.searchsorted(bounds, lo)
+    hi = numpy.searchsorted(bounds, hi)
+
+    n = sums[0, hi] - sums[0, lo]
+    s = sums[1, hi] - sums[1, lo]
+    s2 = sums[2, hi] - sums[2, lo]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        mean = numpy.where(n > 0, s/n, numpy.nan)
+        var = numpy.where(n > 1, (s2 - s**2/n)/(n - 1), numpy.nan)
+    std = numpy.sqrt(numpy.maximum(var, 0))
+    std[numpy.isnan(var)] = numpy.nan
+
+    mean = pd.DataFrame(mean, index=windows.index, columns=values.columns)
+    std = pd.DataFrame(std, index=windows.index, columns=values.columns)
+    count = pd.DataFrame(n.astype(int), index=windows.index, columns=values.columns)
+    if by_size:
+        mean, std, count = [frame.T.rename_axis('Dp') for frame in (mean, std, count)]
+        for frame in (mean, std, count):
+            frame.index = frame.index.astype(float).astype(int)
+    return mean, std, count
 
-    smps_daily_std_df['factorA'] = smps_daily_std_df['Dp2 (m2)']*3.14159
-    smps_daily_std_df.set_index('Dp', inplace=True)
+def surface_area(smps_daily_mean_df, smps_daily_std_df, nbins):
+    '''
+    Calculates particle surface area distributions and totals from daily mean (and standard deviation) size distributions.
 
-    # Calculate particles/cm^3 of air (un-normalized) by multiplying through by the normalizing constant (log of particle diameter bin size)
-    dN=smps_daily_mean_df.iloc[:,:-3]*dLogDp
-    dN_std = smps_daily_std_df.iloc[:,:-3]*dLogDp
+    The input dataframes are not changed. See :py:func:`psd_surface_area` to work on arrays, e.g. every scan of a binary store.
 
-    # Calculate surface area per unit volume of air (m^2/cm^3)
-    dA=dN.mul(smps_daily_mean_df['factorA'],0)
-    dA_std=dN_std.mul(smps_daily_std_df['factorA'],0)
+    Parameters
+    ------------
+    smps_daily_mean_df : df
+        Mean dNdLogDp where rows are diameters (nm) and columns are days.
+    smps_daily_std_df : df
+        Standard deviation of dNdLogDp, with the same rows and columns.
+    nbins : int
+        Number of diameter bins.
 
-    # Convert surface area units from m^2/cm^3 to um^2/cm^3
-    dA=dA*1e12
-    dA_std=dA_std*1e12
+    Returns
+    ------------
+    dAdLogDp : df
+        Log-normalized surface area distribution (nm2/cm3) where rows are diameters and columns are days.
+    dA_total : df
+        Total surface area (um2/cm3) of each day, in column SA.
+    dN_total : df
+        Total particle count (#/cm3) of each day, in column DN.
+    dAdLogDp_std : df
+        Standard deviation of dAdLogDp.
+    '''
+    # Calculate log of particle diameter bin size (dLogDp)
+    Dp = smps_daily_mean_df.index.to_numpy(dtype=float)
+    dLogDp = size_bins(Dp[0], Dp[-1], nbins).dLogDp
 
-    # Normalize by log of particle diameter bin size (dLogDp) for surface area          distribution (nm^2/cm^3)
-    dAdLogDp = (dA*1e6)/dLogDp
-    dAdLogDp_std = (dA_std*1e6)/dLogDp
+    dA, dAdLogDp, dA_total, dN_total = psd_surface_area(Dp, smps_daily_mean_df.to_numpy(), dLogDp, axis=0)
+    dAdLogDp_std = psd_surface_area(smps_daily_std_df.index.to_numpy(dtype=float), smps_daily_std_df.to_numpy(), dLogDp, axis=0)[1]
 
-    # Sum all size bins to calculate total surface area (um^2/cm^3)
-    dA_total=dA.sum(axis=0).to_frame()
-    dA_total.rename(columns={0:'SA'},inplace=True)
-    dN_total=dN.sum(axis=0).to_frame()
-    dN_total.rename(columns={0:'DN'},inplace=True)
+    dAdLogDp = pd.DataFrame(dAdLogDp, index=smps_daily_mean_df.index, columns=smps_daily_mean_df.columns)
+    dAdLogDp_std = pd.DataFrame(dAdLogDp_std, index=smps_daily_std_df.index, columns=smps_daily_std_df.columns)
+    dA_total = pd.DataFrame({'SA': dA_total}, index=smps_daily_mean_df.columns)
+    dN_total = pd.DataFrame({'DN': dN_total}, index=smps_daily_mean_df.columns)
     return dAdLogDp, dA_total, dN_total, dAdLogDp_std
 
 def plot_number_dist(smps_daily_mean_df, smps_daily_std_df):
@@ -1219,36 +3167,57 @@ def plot_surface_dist(dAdLogDp, dAdLogDp_std):
     return fig
     #fig.write_image("manuscripts\\IN\\FIGURES\\response_figs\\figS4.png", scale=4)
 
+def wilson_interval(p, n = 26, z = 1.96):
+    '''
+    Calculates the lower and upper bounds of the Wilson score interval of frozen fractions.
+
+    All arguments can be scalars or arrays (broadcast against each other), so a whole report or campaign is done at once,
+    with a different number of tubes or sigma per sample if needed.
+
+    Parameters
+    ------------
+    p : float or array
+        Frozen fraction.
+    n : int or array
+        Number of tubes. [DEFAULT = 26]
+    z : float or array
+        z value of the confidence level. [DEFAULT = 1.96]
+
+    Returns
+    ------------
+    lower_bound, upper_bound : array
+        Bounds of the interval. Where the interval is undefined (negative variance, e.g. a frozen fraction below 0 after blank subtraction)
+        both bounds are 0.
+    '''
+    p = numpy.asarray(p, dtype=float)
+    n = numpy.asarray(n, dtype=float)
+    z = numpy.asarray(z, dtype=float)
+
+    denominator = 1 + z*z/n
+    centre_adjusted_probability = p + z*z / (2*n)
+    variance = (p*(1 - p) + z*z / (4*n)) / n
+    invalid = variance < 0
+    adjusted_standard_deviation = numpy.sqrt(numpy.where(invalid, 0, variance))
+
+    lower_bound = numpy.where(invalid, 0, (centre_adjusted_probability - z*adjusted_standard_deviation) / denominator)
+    upper_bound = numpy.where(invalid, 0, (centre_adjusted_probability + z*adjusted_standard_deviation) / denominator)
+    return lower_bound, upper_bound
+
 def wilsonLower(p, n=26, z = 1.96):
     '''
     p is the frozen fraction
     n is number of tubes
     z is confidence level
-    '''
-    try:
-        denominator = 1 + z**2/n
-        centre_adjusted_probability = p + z*z / (2*n)
-        adjusted_standard_deviation = math.sqrt((p*(1 - p) + z*z / (4*n)) / n)
 
-        lower_bound = (centre_adjusted_probability - z*adjusted_standard_deviation) / denominator
-        upper_bound = (centre_adjusted_probability + z*adjusted_standard_deviation) / denominator
-
-        return(lower_bound)
-    except ValueError:
-        return(0)
+    Scalar version of :py:func:`wilson_interval` (lower bound).
+    '''
+    return float(wilson_interval(p, n, z)[0])
 
 def wilsonUpper(p, n=26, z = 1.96):
-    try:
-        denominator = 1 + z**2/n
-        centre_adjusted_probability = p + z*z / (2*n)
-        adjusted_standard_deviation = math.sqrt((p*(1 - p) + z*z / (4*n)) / n)
-
-        lower_bound = (centre_adjusted_probability - z*adjusted_standard_deviation) / denominator
-        upper_bound = (centre_adjusted_probability + z*adjusted_standard_deviation) / denominator
-
-        return(upper_bound)
-    except ValueError:
-        return(0)
+    '''
+    Scalar version of :py:func:`wilson_interval` (upper bound).
+    '''
+    return float(wilson_interval(p, n, z)[1])
 
 def calculate_wilson_errors(project, location, type_, n = 26):
     '''
@@ -1287,8 +3256,7 @@ def calculate_wilson_errors(project, location, type_, n = 26):
                     singleFile= pd.read_excel('..\\data\\interim\\IN\\calculated\\'+type_+'\\'+proc+'\\'+file, sheet_name='summary', header=5)
                     singleFile=singleFile.loc[:,'T (*C)':]    
 
-                    singleFile['lowerBound']=singleFile['FrozenFraction'].apply(wilsonLower)
-                    singleFile['upperBound']=singleFile['FrozenFraction'].apply(wilsonUpper)
+                    singleFile['lowerBound'], singleFile['upperBound'] = wilson_interval(singleFile['FrozenFraction'], n)
                     
                     singleFile['upper_N-BLNK']=singleFile['upperBound']*n
                     singleFile['lower_N-BLNK']=singleFile['lowerBound']*n
@@ -1334,19 +3302,22 @@ def calculate_wilson_errors(project, location, type_, n = 26):
     else:
         for file in os.listdir("..\\data\\interim\\IN\\calculated\\"+type_+"\\"+location+'\\'):
             if file.endswith('.xlsx'):
+                tables, meta_dict = read_report('..\\data\\interim\\IN\\calculated\\'+type_+'\\'+location+'\\'+file)
+                # number of tubes and sigma of this sample
+                num_tubes = meta_dict.get('# tubes', n)
+                sigma = meta_dict.get('sigma', 1.96)
                 for proc in ['UH','H']:
                     if type_ == 'seawater':
                         error=pd.DataFrame()
-                        singleFile= pd.read_excel('..\\data\\interim\\IN\\calculated\\'+type_+'\\'+location+'\\'+file, sheet_name='summary_UF_'+proc, header=0)   
+                        singleFile= tables[proc].copy()
 
-                        singleFile['lowerBound']=singleFile['FrozenFraction'].apply(wilsonLower)
-                        singleFile['upperBound']=singleFile['FrozenFraction'].apply(wilsonUpper)
+                        singleFile['lowerBound'], singleFile['upperBound'] = wilson_interval(singleFile['FrozenFraction'], num_tubes, sigma)
                         
-                        singleFile['upper_N-BLNK']=singleFile['upperBound']*n
-                        singleFile['lower_N-BLNK']=singleFile['lowerBound']*n
+                        singleFile['upper_N-BLNK']=singleFile['upperBound']*num_tubes
+                        singleFile['lower_N-BLNK']=singleFile['lowerBound']*num_tubes
 
-                        singleFile['IN/tube_upper']=numpy.log(n)-numpy.log(n-singleFile['upper_N-BLNK'])
-                        singleFile['IN/tube_lower']=numpy.log(n)-numpy.log(n-singleFile['lower_N-BLNK'])
+                        singleFile['IN/tube_upper']=numpy.log(num_tubes)-numpy.log(num_tubes-singleFile['upper_N-BLNK'])
+                        singleFile['IN/tube_lower']=numpy.log(num_tubes)-numpy.log(num_tubes-singleFile['lower_N-BLNK'])
                         
                         singleFile['IN/ml_upper']=singleFile['IN/tube_upper']/.2
                         singleFile['IN/ml_lower']=singleFile['IN/tube_lower']/.2
@@ -1378,7 +3349,7 @@ def calculate_wilson_errors(project, location, type_, n = 26):
                     
                     elif type_ == 'aerosol':
                         error=pd.DataFrame()
-                        singleFile= pd.read_excel('..\\data\\interim\\IN\\calculated\\'+type_+'\\'+location+'\\'+file, sheet_name='summary_UF_'+proc, header=0)   
+                        singleFile= tables[proc].copy()
 
                         error['IN/L_lower']=singleFile['lower INP/L']
                         error['IN/L_upper']=singleFile['upper INP/L']
@@ -1580,17 +3551,92 @@ def plot_ssw_inp(inp_df):
     
     return fig
 
-def clean_aqualog(instr, outpath):
+def _read_aqualog_file(path):
+    '''
+    Reads one raw aqualog file. Returns the cleaned column names and the data lines as text.
+    '''
+    with open(path) as f:
+        header = f.readline()
+        data = f.read()
+    # Remove all bad chars from column names
+    columns = [name.strip().replace('#', '').replace(' ', '').lower().replace('utciso8601', 'time') for name in header.rstrip('\r\n').split('\t')]
+    if 'time' not in columns:
+        raise ValueError(f'{path} is not an aqualog file (no UTC ISO8601 column).')
+    if data and not data.endswith('\n'):
+        data += '\n'
+    return columns, data
+
+def save_aqualog_store(df, path):
+    '''
+    Adds aqualog data to a time partitioned columnar store: a folder with one Parquet file per UTC day, named [YYYY-MM-DD].parquet.
+
+    Days that are already in the store are merged with the new data, keeping the stored record where both have the same time.
+    Requires pyarrow.
+
+    Parameters
+    ------------
+    df : df
+        Aqualog data with a DatetimeIndex named time, as returned by :py:func:`clean_aqualog`.
+    path : str
+        Folder of the store. [example: '..\\data\\interim\\aqlog1\\aqlog1_store']
+    '''
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError('The aqualog store requires pyarrow. Install it or set store=False.')
+    os.makedirs(path, exist_ok=True)
+    days = df.index.floor('D')
+    for day in days.unique():
+        part = df[days == day]
+        file = os.path.join(path, day.strftime('%Y-%m-%d') + '.parquet')
+        if os.path.exists(file):
+            part = combine_frames([pd.read_parquet(file), part]).sort_index(kind='stable')
+            part = part[~part.index.duplicated()]
+        part.to_parquet(file)
+
+def load_aqualog_store(path, start = None, end = None):
+    '''
+    Loads aqualog data from a store saved with :py:func:`save_aqualog_store`. Only the days between start and end are read.
+
+    Parameters
+    ------------
+    path : str
+        Folder of the store.
+    start : str or datetime
+        First time to include. [DEFAULT = None, from the first record]
+    end : str or datetime
+        Last time to include. [DEFAULT = None, up to the last record]
+
+    Returns
+    ------------
+    df : df
+        Aqualog data with a DatetimeIndex named time.
+    '''
+    start = None if start is None else pd.Timestamp(start)
+    end = None if end is None else pd.Timestamp(end)
+    files = []
+    for file in sorted(os.listdir(path)):
+        if not file.endswith('.parquet'):
+            continue
+        day = pd.Timestamp(file[:-8])
+        if (start is None or day >= start.floor('D')) and (end is None or day <= end):
+            files.append(os.path.join(path, file))
+    if len(files) == 0:
+        raise ValueError(f'No aqualog data between {start} and {end} in {path}.')
+    df = combine_frames([pd.read_parquet(file) for file in files])
+    return df.loc[start:end]
+
+def clean_aqualog(instr, outpath, inpath = None, max_workers = None, store = False):
     '''
     Loads all raw aqualog data files for a given instrument (aqlog1 or aqlog2) and cleans it up.
     Returns the cleaned dataset to chosen outpath. 
     
     The steps of the cleaning process are as follows:
-        1) open all data files in te data/raw folder path
-        2) append all data files into one df
+        1) read all data files in the input folder (or matching the input pattern) concurrently, on a thread pool
+        2) parse the data of all files in one pass, with the column names of the first file
         3) remove bad chars in column names
-        4) create a timeString column in UTC time
-        5) save df to csv in specified folder
+        4) create a DatetimeIndex named time in UTC and drop records repeated in consecutive files
+        5) save df to csv in specified folder, and optionally add it to a time partitioned columnar store
     
     Parameters
     ----------
@@ -1598,38 +3644,50 @@ def clean_aqualog(instr, outpath):
         aqualog1 or aqualog2
     outpath : string 
         location where cleaned csv file is saved.
+    inpath : string
+        Folder of the raw files, or a glob pattern of them. [DEFAULT = None, ..\\data\\raw\\[instr]\\]
+    max_workers : int
+        Number of threads used to read the files. [DEFAULT = None, chosen by concurrent.futures]
+    store : bool
+        Also add the data to the store in the folder [instr]_store in outpath (see :py:func:`save_aqualog_store`). Requires pyarrow. [DEFAULT = False]
     
     Returns
     -------
     dfBig : df
-        the df that was just saved to a folder
+        the df that was just saved to a folder, with a DatetimeIndex named time
     outName : string
         string of the start and end datetimes
     
     '''
-    dfBig=pd.DataFrame()
-    path='C:\\Users\\trueblood\\projects\\nz2020\\New-Zealand-2020\\data\\raw\\'+instr+'\\'
-
-    #Read in all the files in a given folder.
-    for file in os.listdir(path):
-        if file.endswith('.csv'):
-            df = pd.read_csv(path+file, sep='\t', parse_dates=['# UTC ISO8601'])
-            dfBig = dfBig.append(df)
-            # Read in column names
-            columns = pd.read_csv(path+file,nrows=0,sep='\t').columns.tolist()
-            # Remove all bad chars from column names
-            for name in range(len(columns)):
-                columns[name]=(columns[name]).strip()
-                columns[name]=(columns[name]).replace("#","")
-                columns[name]=(columns[name]).replace(" ","")
-                columns[name]=columns[name].lower()
-                columns[name]=(columns[name]).replace("utciso8601","time")
-    dfBig.columns = columns
-    dfBig['timeString'] = dfBig['time'].dt.strftime('%Y-%m-%d %H:%M:%S')
-    dfBig=dfBig.set_index(['timeString'])
-    dfBig.time=dfBig.time.dt.tz_localize(None)
-    strt=dfBig.index[0]
-    end=dfBig.index[-1]
-    outName = strt[0:10]+'_'+end[0:10]
-    dfBig.to_csv(outpath+outName+'.csv')
-    return dfBig, outName
\ No newline at end of file
+    if inpath is None:
+        inpath = os.path.join('..', 'data', 'raw', instr)
+    if os.path.isdir(inpath):
+        paths = [os.path.join(inpath, file) for file in os.listdir(inpath) if file.endswith('.csv')]
+    else:
+        paths = glob.glob(inpath)
+    if len(paths) == 0:
+        raise ValueError(f'No aqualog files found in {inpath}.')
+    paths = sorted(paths)
+
+    #Read in all the files concurrently
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        files = list(executor.map(_read_aqualog_file, paths))
+    columns = files[0][0]
+    for file, (file_columns, _) in zip(paths, files):
+        if file_columns != columns:
+            raise ValueError(f'The columns of {file} do not match those of {paths[0]}.')
+    # the times are parsed once for all files, every other column is numeric
+    dfBig = pd.read_csv(io.StringIO(''.join(text for _, text in files)), sep='\t', header=None, names=columns, dtype={'time': str}, engine='c')
+    time = pd.DatetimeIndex(pd.to_datetime(dfBig.pop('time').str.strip(), format='ISO8601'))
+    if time.tz is not None:
+        time = time.tz_convert('UTC').tz_localize(None)
+    dfBig.index = time.rename('time')
+    # consecutive files can overlap, keep each record once
+    dfBig = dfBig.sort_index(kind='stable')
+    dfBig = dfBig[~dfBig.index.duplicated()]
+
+    outName = dfBig.index[0].strftime('%Y-%m-%d')+'_'+dfBig.index[-1].strftime('%Y-%m-%d')
+    dfBig.to_csv(os.path.join(outpath, outName+'.csv'))
+    if store:
+        save_aqualog_store(dfBig, os.path.join(outpath, instr+'_store'))
+    return dfBig, outName
@@ -0,0 +1,24 @@
+'''
+Regression checks of freezing_temperatures on the tutorial raw data.
+
+Run from the repository root:
+
+    python -m pytest tests
+'''
+import os
+import sys
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import pyce_tools.pyce_tools as pt
+
+BLANK = os.path.join(os.path.dirname(__file__), '..', 'tutorial', 'data', 'raw', 'IN', 'blank', 'bubbler_blank_uf_sub_060420.csv')
+
+def test_dropout_is_not_freezing():
+    # the tutorial blank has an all-tube dropout over scans 416-417, at about -17.25 *C
+    times, values = pt.read_linda_raw(BLANK)
+    temperature, t_freeze = pt.freezing_temperatures(values)
+    for process, positions in pt.LINDA_POSITIONS.items():
+        at_dropout = numpy.abs(t_freeze[positions - 1] - temperature[416]) < 0.1
+        assert at_dropout.sum() <= 3, f'{at_dropout.sum()} {process} tubes freeze during the dropout'